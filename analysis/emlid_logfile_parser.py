@@ -1,6 +1,187 @@
+"""
+Parses Emlid Reach LLH logs (solution logs) into lat/lon CSVs, course
+files and GeoJSON.
+
+Each LLH line is: date, time, lat, lon, height, Q (solution quality:
+1 fix, 2 float, 5 single), ns (number of satellites), sdn, sde, sdu, sdne,
+sdeu, sdun (standard deviations, meters), age and ratio. The log is read a
+chunk of lines at a time into typed numpy columns (see read_llh), which all
+the writers use.
+"""
+
+import os
 import sys
 import csv
+import time
 import json
+import itertools
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+import course_simplify  # local requirement, from scripts/
+import projection  # local requirement, from scripts/
+
+
+
+LLH_COLUMNS = [
+	('lat', np.float64),
+	('lon', np.float64),
+	('height', np.float64),
+	('Q', np.int8),
+	('ns', np.int16),
+	('sdn', np.float64),
+	('sde', np.float64),
+	('sdu', np.float64),
+	('sdne', np.float64),
+	('sdeu', np.float64),
+	('sdun', np.float64),
+	('age', np.float64),
+	('ratio', np.float64)
+]
+LLH_NUM_TOKENS = 2 + len(LLH_COLUMNS)  # date and time, then the columns above
+
+Q_FIX = 1
+Q_FLOAT = 2
+Q_SINGLE = 5
+
+
+
+def parse_llh_lines(lines):
+	"""
+	Parses LLH lines into a dict of column arrays ('time' is datetime64[ms],
+	the rest are typed per LLH_COLUMNS). Blank and malformed lines are skipped.
+	"""
+	tokens = ' '.join(lines).split()
+
+	if len(tokens) != LLH_NUM_TOKENS * len(lines):
+		# blank or malformed lines, keeps the ones with the right number of values:
+		lines = [line for line in lines if len(line.split()) == LLH_NUM_TOKENS]
+		tokens = ' '.join(lines).split()
+
+	num_rows = len(tokens) // LLH_NUM_TOKENS
+
+	if num_rows == 0:
+		columns = dict((name, np.zeros(0, dtype=dtype)) for name, dtype in LLH_COLUMNS)
+		columns['time'] = np.zeros(0, dtype='datetime64[ms]')
+		return columns
+
+	try:
+		return columns_from_tokens(tokens, num_rows)
+	except ValueError:
+		# a value that isn't a number or time (e.g., a garbled character), parses
+		# the lines one at a time, skipping the ones that fail:
+		rows = [row for row in map(parse_llh_line, lines) if row is not None]
+		columns = columns_from_tokens([token for row in rows for token in row], len(rows))
+		print("Skipped {} malformed LLH lines..".format(len(lines) - len(rows)))
+		return columns
+
+
+
+def parse_llh_line(line):
+	"""
+	Tokens of an LLH line if its date, time and values all parse,
+	otherwise None.
+	"""
+	tokens = line.split()
+
+	if len(tokens) != LLH_NUM_TOKENS:
+		return None
+
+	try:
+		np.datetime64("{}T{}".format(tokens[0].replace('/', '-'), tokens[1]), 'ms')
+		values = np.fromstring(' '.join(tokens[2:]), dtype=np.float64, sep=' ')  # same parser as parse_llh_lines
+	except ValueError:
+		return None
+
+	if len(values) != len(LLH_COLUMNS):
+		return None  # older numpy stops at a bad value instead of raising
+
+	return tokens
+
+
+
+def columns_from_tokens(tokens, num_rows):
+	"""
+	Column arrays (see parse_llh_lines) from the tokens of num_rows LLH
+	lines.
+	"""
+	if num_rows == 0:
+		return parse_llh_lines([])
+
+	columns = {}
+
+	dates = np.char.replace(np.array(tokens[0::LLH_NUM_TOKENS], dtype=str), '/', '-')
+	columns['time'] = np.char.add(np.char.add(dates, 'T'), np.array(tokens[1::LLH_NUM_TOKENS], dtype=str)).astype('datetime64[ms]')
+
+	# numpy's text parser does all the number columns at once (a row per column):
+	values_str = ' '.join(' '.join(tokens[i::LLH_NUM_TOKENS]) for i in range(2, LLH_NUM_TOKENS))
+	values = np.fromstring(values_str, dtype=np.float64, sep=' ').reshape(len(LLH_COLUMNS), num_rows)
+
+	for i, (name, dtype) in enumerate(LLH_COLUMNS):
+		columns[name] = values[i].astype(dtype)
+
+	return columns
+
+
+
+def iter_llh_chunks(filename, chunk_lines=50000):
+	"""
+	Yields column dicts (see parse_llh_lines) for chunks of up to
+	chunk_lines lines of an LLH file.
+	"""
+	with open(filename, 'r') as filein:
+		while True:
+			lines = list(itertools.islice(filein, chunk_lines))
+			if not lines:
+				return
+			yield parse_llh_lines(lines)
+
+
+
+def filter_by_quality(columns, quality):
+	"""
+	Keeps the rows whose Q is quality (a Q value or a list of them),
+	e.g., Q_FIX for fixed solutions only.
+	"""
+	keep = np.zeros(len(columns['Q']), dtype=bool)
+	for q in np.atleast_1d(quality):
+		keep |= columns['Q'] == q
+	return dict((name, column[keep]) for name, column in columns.items())
+
+
+
+def concat_columns(chunks):
+	"""
+	Joins a list of column dicts into one.
+	"""
+	if not chunks:
+		return parse_llh_lines([])
+	return dict((name, np.concatenate([chunk[name] for chunk in chunks])) for name in chunks[0])
+
+
+
+def read_llh(filename, quality=None, chunk_lines=50000):
+	"""
+	Reads an LLH file into a dict of column arrays, keeping only rows
+	with Q in quality if it's given (see filter_by_quality).
+	"""
+	chunks = []
+	for columns in iter_llh_chunks(filename, chunk_lines):
+		if quality is not None:
+			columns = filter_by_quality(columns, quality)
+		chunks.append(columns)
+	return concat_columns(chunks)
+
+
+
+def format_llh_times(times):
+	"""
+	datetime64 times back to the LLH format, e.g., '2018/07/02 17:26:39.000'.
+	"""
+	return [t.replace('-', '/').replace('T', ' ') for t in np.datetime_as_string(times, unit='ms')]
+
+
+
 
 
 
@@ -20,9 +201,17 @@ class LogfileParser:
 
 
 
+	def read_llh(self, filename, quality=None):
+		"""
+		LLH file as a dict of column arrays, see read_llh().
+		"""
+		return read_llh(filename, quality)
+
+
+
 	def write_to_output_csv(self, filename, csv_data):
 
-		fileout = open(filename, 'wb')
+		fileout = open(filename, 'w', newline='') if sys.version_info[0] >= 3 else open(filename, 'w')  # csv module does its own line endings
 		csvwriter = csv.writer(fileout)
 		csvwriter.writerows(csv_data)
 		fileout.close()
@@ -37,71 +226,77 @@ class LogfileParser:
 
 
 
-	def convert_emlid_logfile_to_latlons(self, input_filename, output_filename):
+	def convert_emlid_logfile_to_latlons(self, input_filename, output_filename, quality=None):
+		"""
+		Writes a CSV of lat,lons, one row per LLH solution.
+		"""
+		columns = self.read_llh(input_filename, quality)
+
+		self.write_to_output_csv(output_filename, np.column_stack((columns['lat'], columns['lon'])).tolist())
 
-		data_from_file = self.open_input_file(input_filename)
 
-		data_list = data_from_file.split('\n')  # gets each row of data
-		data_arrary = []  # list of list for csv output
 
-		for data_row in data_list:
-			data_row_list = data_row.split('  ')
-			for item in data_row_list:
-				if len(item) > 0:
-					data_arrary.append([data_row_list[1], data_row_list[2]])  # grabs lat/lons
+	def convert_emlid_logfile_to_course(self, input_filename, output_filename, n_skip=1, date=None, location=None, quality=None, tolerance=None):
 
-		self.write_to_output_csv(output_filename, data_arrary)
+		columns = self.read_llh(input_filename, quality)
 
+		print("Getting every {}th row..".format(n_skip))
+
+		self.write_to_output_json(output_filename, self.build_course(columns, n_skip, date, location, tolerance))
 
 
-	def convert_emlid_logfile_to_course(self, input_filename, output_filename, n_skip=1, date=None, location=None):
 
+	def build_course(self, columns, n_skip=1, date=None, location=None, tolerance=None):
+		"""
+		Course JSON object (goals with decPos, utmPos and time) from LLH
+		columns, ready for NavCourse.from_course and the drive nodes.
+		tolerance (meters) simplifies the course, see course_simplify.
+		"""
 		data_json = {}
 		data_json['goals'] = []
 		data_json['date'] = date
 		data_json['units'] = "dec"
 		data_json['location'] = location
 
+		lats = columns['lat'][::n_skip].tolist()
+		lons = columns['lon'][::n_skip].tolist()
+		times = format_llh_times(columns['time'][::n_skip])
 
-		data_from_file = self.open_input_file(input_filename)
-
-		data_list = data_from_file.split('\n')  # gets each row of data
-
-		ind = 1  # index counter
-
-		print("Getting every {}th row..".format(n_skip))
-
-		for i in range(0, len(data_list) - 1, n_skip):
+		if tolerance:
+			indices = course_simplify.simplify_latlon_indices(lats, lons, tolerance).tolist()
+			print("Simplified {} points to {} ({}m tolerance)..".format(len(lats), len(indices), tolerance))
+			lats, lons, times = [lats[i] for i in indices], [lons[i] for i in indices], [times[i] for i in indices]
 
-			data_row_list = data_list[i].split('  ')
+		if lats:
+			utm_projection = projection.UTMProjection.from_latlon(lats[0], lons[0])  # first point's zone, like the drive nodes' /fix conversion
+			eastings, northings = utm_projection.to_utm_batch(lats, lons)
+			eastings, northings = eastings.tolist(), northings.tolist()
 
-			_time = None  # get timestamp of position datum
-
-			for item in data_row_list:
-				if len(item) > 0:
-					decPos =  {
-						'lat': float(data_row_list[1]),
-						'lon': float(data_row_list[2])
-					}
-					_time = data_row_list[0]
+		for i in range(len(lats)):
 
 			goal_obj = {
-				'index': ind,
+				'index': i + 1,
 				'dsmPos': {},
-				'utmPos': {},
-				'decPos': decPos,
-				'time': _time
+				'utmPos': {
+					'easting': eastings[i],
+					'northing': northings[i],
+					'zone': utm_projection.zone_number,
+					'letter': utm_projection.zone_letter
+				},
+				'decPos': {
+					'lat': lats[i],
+					'lon': lons[i]
+				},
+				'time': times[i]
 			}
 
 			data_json['goals'].append(goal_obj)
 
-			ind += 1
-
-		self.write_to_output_json(output_filename, data_json)
+		return data_json
 
 
 
-	def convert_emlid_logfile_to_geojson(self, input_filename, output_filename):
+	def convert_emlid_logfile_to_geojson(self, input_filename, output_filename, quality=None):
 
 		n_skip = 1
 
@@ -109,21 +304,11 @@ class LogfileParser:
 		data_json['type'] = "FeatureCollection"
 		data_json['features'] = []
 
-		data_from_file = self.open_input_file(input_filename)
-		data_list = data_from_file.split('\n')  # gets each row of data
+		columns = self.read_llh(input_filename, quality)
 
 		print("Getting every {}th data point".format(n_skip))
 
-		for i in range(0, len(data_list) - 1, n_skip):
-
-			data_row_list = data_list[i].split('  ')
-
-			_lat, _lon = None, None
-
-			for item in data_row_list:
-				if len(item) > 0:
-					_lat = float(data_row_list[1])
-					_lon = float(data_row_list[2])
+		for _lat, _lon in np.column_stack((columns['lat'], columns['lon']))[::n_skip].tolist():
 
 			feature_obj = {
 				'type': "Feature",
@@ -137,29 +322,172 @@ class LogfileParser:
 
 		self.write_to_output_json(output_filename, data_json)
 
-		
 
 
 
 
+class LLHFollower(object):
+	"""
+	Follows an LLH file while the Reach is still logging to it, like
+	tail -f. Each poll() parses only the complete lines written since the
+	last one and adds them to a rolling track (column arrays of the last
+	max_points solutions, or all of them). New solutions can be appended to
+	a lat/lon CSV and/or passed to a publish callback, and the track is
+	written as a course file when following stops.
+	"""
+
+	def __init__(self, filename, quality=None, max_points=None, latlons_filename=None, course_filename=None, publish=None):
+
+		self.filename = filename
+		self.quality = quality  # Q value(s) to keep, see filter_by_quality
+		self.max_points = max_points  # None keeps the whole track
+		self.latlons_filename = latlons_filename  # lat,lon rows are appended to this as they come in
+		self.course_filename = course_filename  # course JSON written by save_course()
+		self.publish = publish  # called with each poll's new columns
+
+		self.offset = 0  # file position after the last complete line parsed
+		self.partial = b''  # start of a line that hasn't been finished yet
+		self.track = parse_llh_lines([])
+		self.num_solutions = 0  # solutions parsed in total (the track may keep fewer)
+
+
+
+	def poll(self):
+		"""
+		Parses lines added to the file since the last poll. Returns the
+		new solutions' columns, or None if there weren't any.
+		"""
+		try:
+			size = os.path.getsize(self.filename)
+		except OSError:
+			return None  # not created yet
+
+		if size < self.offset + len(self.partial):
+			print("{} got smaller, following it from the start..".format(self.filename))
+			self.offset, self.partial = 0, b''
+			self.track = parse_llh_lines([])
+
+		with open(self.filename, 'rb') as filein:
+			filein.seek(self.offset + len(self.partial))
+			data = self.partial + filein.read()
+
+		end = data.rfind(b'\n') + 1  # only complete lines
+		self.partial = data[end:]
+
+		if end == 0:
+			return None
+
+		self.offset += end
+
+		return self.add_lines(data[:end].decode('ascii', 'replace').splitlines())
+
+
+
+	def add_lines(self, lines):
+
+		columns = parse_llh_lines(lines)
+
+		if self.quality is not None:
+			columns = filter_by_quality(columns, self.quality)
+
+		if len(columns['lat']) == 0:
+			return None
+
+		self.num_solutions += len(columns['lat'])
+		self.track = concat_columns([self.track, columns])
+
+		if self.max_points and len(self.track['lat']) > self.max_points:
+			self.track = dict((name, column[-self.max_points:]) for name, column in self.track.items())
+
+		if self.latlons_filename:
+			with open(self.latlons_filename, 'a') as fileout:
+				fileout.write(''.join("{},{}\n".format(lat, lon) for lat, lon in zip(columns['lat'].tolist(), columns['lon'].tolist())))
+
+		if self.publish:
+			self.publish(columns)
+
+		return columns
+
+
+
+	def flush(self):
+		"""
+		Parses the last line if the log ended without a newline.
+		"""
+		self.poll()
+		if not self.partial:
+			return None
+		line, self.partial = self.partial, b''
+		self.offset += len(line)
+		return self.add_lines([line.decode('ascii', 'replace')])
+
+
+
+	def save_course(self, n_skip=1, date=None, location=None, tolerance=None):
+		"""
+		Writes the track as a course JSON file (see
+		LogfileParser.convert_emlid_logfile_to_course).
+		"""
+		lp = LogfileParser()
+		tmp_filename = self.course_filename + '.tmp'
+		lp.write_to_output_json(tmp_filename, lp.build_course(self.track, n_skip, date, location, tolerance))
+		os.rename(tmp_filename, self.course_filename)  # so a drive node never loads a half written course
+
+
+
+	def follow(self, poll_interval=0.5, idle_timeout=None, n_skip=1, date=None, location=None, tolerance=None):
+		"""
+		Polls the file until nothing's been added for idle_timeout seconds
+		(or Ctrl+C), then writes the course file if there is one.
+		"""
+		print("Following {}..".format(self.filename))
+
+		last_data_time = time.time()
+
+		try:
+			while idle_timeout is None or time.time() - last_data_time < idle_timeout:
+				columns = self.poll()
+				if columns is not None:
+					last_data_time = time.time()
+					print("{} solutions, last: {}, {}".format(self.num_solutions, columns['lat'][-1], columns['lon'][-1]))
+				time.sleep(poll_interval)
+		except KeyboardInterrupt:
+			pass
+
+		self.flush()
+
+		if self.course_filename:
+			self.save_course(n_skip, date, location, tolerance)
+			print("Saved course with {} points to {}".format(len(self.track['lat']), self.course_filename))
 
 
-	
 
 
 
 if __name__ == '__main__':
 
+	if sys.argv[1] == '--follow':
+		# Follows an LLH file while it's being logged, then saves it as a course file,
+		# e.g., python emlid_logfile_parser.py --follow reach.LLH course.json [idle timeout (s)] [quality]:
+		idle_timeout = float(sys.argv[4]) if len(sys.argv) > 4 else 10.0
+		quality = int(sys.argv[5]) if len(sys.argv) > 5 else None
+		LLHFollower(sys.argv[2], quality, course_filename=sys.argv[3]).follow(idle_timeout=idle_timeout)
+		sys.exit(0)
+
 	filename = sys.argv[1]  # gets filename of .LLH file from emlid
 	parsedfilename = sys.argv[2]  # gets filename to save parsed data
 	date = None
 	location = None
 	n_skip = None
+	quality = None  # e.g., 1 for fix solutions only
+	tolerance = None  # meters, simplifies the course (see scripts/course_simplify.py)
 
 	try:
 		n_skip = int(sys.argv[3])
 		date = sys.argv[4]
 		location = sys.argv[5]
+		quality = int(sys.argv[6])
+		tolerance = float(sys.argv[7])
 	except IndexError:
 		pass
 	except Exception:
@@ -168,10 +496,10 @@ if __name__ == '__main__':
 	lp = LogfileParser()
 
 	# Parses emlid log into file of lat,lons:
-	lp.convert_emlid_logfile_to_latlons(filename, parsedfilename)
+	lp.convert_emlid_logfile_to_latlons(filename, parsedfilename, quality)
 	
 	# Parses emlid log into course file format:
-	# lp.convert_emlid_logfile_to_course(filename, parsedfilename, n_skip, date, location)
+	# lp.convert_emlid_logfile_to_course(filename, parsedfilename, n_skip, date, location, quality, tolerance)
 
 	# Parses emlid log into geojson file format:
-	# lp.convert_emlid_logfile_to_geojson(filename, parsedfilename)
\ No newline at end of file
+	# lp.convert_emlid_logfile_to_geojson(filename, parsedfilename, quality)
\ No newline at end of file
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+"""
+Tests for parsing Emlid LLH lines, run with python -m unittest from analysis/.
+"""
+
+import unittest
+import numpy as np
+
+import emlid_logfile_parser
+
+
+
+LLH_LINES = [
+	"2018/07/02 17:26:39.000   31.519286679  -83.548881144    85.4140   1  20   0.0059   0.0058   0.0139  -0.0030   0.0055  -0.0040   1.80  999.9\n",
+	"2018/07/02 17:26:39.200   31.519287510  -83.548883218    85.4294   1  19   0.0060   0.0058   0.0145  -0.0031   0.0056  -0.0045   2.01  999.9\n",
+	"2018/07/02 17:26:39.400   31.519288227  -83.548885210    85.4319   1  18   0.0068   0.0058   0.0146  -0.0032   0.0056  -0.0051   0.20  999.9\n"
+]
+
+
+
+class ParseLLHLinesTest(unittest.TestCase):
+
+	def test_parses_columns(self):
+		columns = emlid_logfile_parser.parse_llh_lines(LLH_LINES)
+
+		self.assertEqual(len(columns['lat']), 3)
+		self.assertAlmostEqual(columns['lon'][1], -83.548883218)
+		self.assertEqual(columns['Q'].dtype, np.int8)
+		self.assertEqual(columns['ns'].tolist(), [20, 19, 18])
+		self.assertEqual(emlid_logfile_parser.format_llh_times(columns['time'][:1]), ['2018/07/02 17:26:39.000'])
+
+	def test_skips_blank_and_short_lines(self):
+		columns = emlid_logfile_parser.parse_llh_lines([LLH_LINES[0], "\n", "2018/07/02 17:26:39.200   31.5\n", LLH_LINES[2]])
+
+		self.assertEqual(columns['ns'].tolist(), [20, 18])
+
+	def test_skips_corrupted_lines(self):
+		corrupted_value = LLH_LINES[1].replace("0.0060", "-", 1)  # right number of tokens, one isn't a number
+		corrupted_time = LLH_LINES[1].replace("17:26:39.200", "17:2#:39.200", 1)
+
+		columns = emlid_logfile_parser.parse_llh_lines([LLH_LINES[0], corrupted_value, corrupted_time, LLH_LINES[2]])
+		expected = emlid_logfile_parser.parse_llh_lines([LLH_LINES[0], LLH_LINES[2]])
+
+		for name in expected:
+			self.assertEqual(columns[name].dtype, expected[name].dtype)
+			self.assertTrue(np.array_equal(columns[name], expected[name]), name)
+
+	def test_empty(self):
+		columns = emlid_logfile_parser.parse_llh_lines([])
+
+		self.assertEqual(len(columns['lat']), 0)
+		self.assertEqual(columns['time'].dtype, np.dtype('datetime64[ms]'))
+
+
+
+if __name__ == '__main__':
+	unittest.main()
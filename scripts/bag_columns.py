@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Python module for bag data stored as typed columns in a .npz file,
+instead of a JSON list of {'lat': .., 'lon': ..} objects.
+
+Each topic gets a '<topic>.time' array (seconds) and one array per key of
+its data objects (see BagHandler's handle_*_data functions), named after
+the topic without its leading slash and with slashes as underscores,
+e.g., 'fix.time', 'fix.lat', 'fix.lon', 'phidget_imu_data.angle'. Number
+fields are float64 arrays, anything else is an array of strings.
+
+Reading these doesn't need ROS, so analysis scripts can load them directly.
+"""
+
+import array
+import numbers
+import numpy as np
+
+# Local package requirements:
+import projection
+
+
+
+def column_prefix(topic):
+	"""
+	Column name prefix for a topic, e.g., '/phidget/imu/data' -> 'phidget_imu_data'.
+	"""
+	return topic.strip('/').replace('/', '_')
+
+
+
+class TopicColumns(object):
+	"""
+	Collects topics' data objects into columns, a message at a time.
+	"""
+
+	def __init__(self):
+		self.counts = {}  # number of messages added per topic prefix
+		self.columns = {}  # column name -> array.array('d') of numbers, or list of strings
+
+
+
+	def add(self, topic, time, data_obj):
+		prefix = column_prefix(topic)
+		count = self.counts.get(prefix, 0)
+
+		self.append(prefix + '.time', count, time)
+
+		for key, value in data_obj.items():
+			self.append("{}.{}".format(prefix, key), count, value)
+
+		self.counts[prefix] = count + 1
+
+		# keys this message didn't have:
+		for name, column in self.columns.items():
+			if name.startswith(prefix + '.') and len(column) == count:
+				column.append(float('nan') if isinstance(column, array.array) else '')
+
+
+
+	def append(self, name, count, value):
+		column = self.columns.get(name)
+
+		if column is None:
+			if value is None or isinstance(value, numbers.Number):
+				column = array.array('d', [float('nan')] * count)  # earlier messages didn't have this key
+			else:
+				column = [''] * count
+			self.columns[name] = column
+
+		if isinstance(column, array.array):
+			column.append(float('nan') if value is None else float(value))
+		else:
+			column.append(str(value))
+
+
+
+	def save(self, output_filename):
+		"""
+		Saves the columns to a .npz file.
+		"""
+		arrays = {}
+		for name, column in self.columns.items():
+			if isinstance(column, array.array):
+				arrays[name] = np.frombuffer(column, dtype=np.float64) if len(column) > 0 else np.zeros(0)
+			else:
+				arrays[name] = np.array(column)
+		np.savez(output_filename, **arrays)
+
+
+
+
+
+
+def load_topic_columns(filename, topic):
+	"""
+	Dict of a topic's columns (key -> array, e.g., 'time', 'lat', 'lon')
+	from a .npz columns file.
+	"""
+	prefix = column_prefix(topic) + '.'
+	data = np.load(filename)
+	columns = dict((name[len(prefix):], data[name]) for name in data.files if name.startswith(prefix))
+	data.close()
+
+	if not columns:
+		raise Exception("No columns for topic {} in {}..".format(topic, filename))
+
+	return columns
+
+
+
+def load_utm_columns(filename, topic='/fix'):
+	"""
+	(eastings, northings) arrays of a GPS topic's lat/lon columns, e.g.,
+	for NavCourse.from_points or NavNudge without building a course file.
+	"""
+	columns = load_topic_columns(filename, topic)
+	lats, lons = columns['lat'], columns['lon']
+
+	if len(lats) == 0:
+		return np.zeros(0), np.zeros(0)
+
+	utm_projection = projection.UTMProjection.from_latlon(lats[0], lons[0])  # zone of the first fix
+
+	return utm_projection.to_utm_batch(lats, lons)
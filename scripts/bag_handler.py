@@ -9,11 +9,13 @@ to initiate the ros bag recording, start and stop.
 import sys
 import rosbag
 import math
+import numbers
 import json
 import utm
 from std_msgs.msg import Int32, String
 from geometry_msgs.msg import Twist, Point, Quaternion
 import PyKDL
+from bag_columns import TopicColumns
 
 
 
@@ -31,43 +33,99 @@ class BagHandler:
 		self.imu_result_obj = {'angle': None}
 		self.reach_result_obj = {'lat': None, 'lon': None}
 
+		# Handler for each topic's messages (topics not in here use handle_generic_data):
+		self.topic_handlers = {
+			self.imu_topic: self.handle_imu_data,
+			self.reach_topic: self.handle_reach_data
+		}
+
 		self.data_from_bag = {}  # the parsed/massaged data from bagfile that'll be used as a course/navigation file for the Rover
+		self.message_counts = {}  # number of messages read per topic
+
+
+	def add_topic_handler(self, topic, handler):
+		"""
+		Sets the function that converts a topic's messages to
+		data objects (dicts), e.g., handle_reach_data.
+		"""
+		self.topic_handlers[topic] = handler
+
+
+	def get_topic_handler(self, topic):
+		return self.topic_handlers.get(topic, self.handle_generic_data)
+
+
+	def iter_data_from_bag(self):
+		"""
+		Yields (topic, time in seconds, data object) for each message of
+		self.topics in the bag, in one pass and without keeping them.
+		"""
+		_bag = rosbag.Bag(self.filename)  # get bag file object
+		self.message_counts = dict((topic, 0) for topic in self.topics)
+
+		try:
+			for topic, msg, t in _bag.read_messages(topics=self.topics):
+				self.message_counts[topic] = self.message_counts.get(topic, 0) + 1
+				yield topic, t.to_sec(), self.get_topic_handler(topic)(msg)
+		finally:
+			_bag.close()
 
 
 	def get_data_from_bag(self):
 		"""
 		Loops through bag data grabbing specific keys and values..
 		"""
-		_bag = rosbag.Bag(self.filename)  # get bag file object
-		# _bag_results = {}  # parsed bag results
 		_bag_results_list = []  # list of bag results
+		_topic_results = {}  # topic -> its results object in the list
 
 		for topic in self.topics:
-			_topic_results = {
+			_topic_results[topic] = {
 				'topic': topic,
 				'data': []
 			}
-			_bag_results_list.append(_topic_results)
+			_bag_results_list.append(_topic_results[topic])
+
+		for topic, _time, _data_obj in self.iter_data_from_bag():
+			_topic_results[topic]['data'].append(_data_obj)
 
+		print("Data from {} topics has been successfully retrieved from bagfile {}".format(self.topics, self.filename))
+		print("Data can now be accessed by the 'data_from_bag' attribute..")
 
-		for topic, msg, t in _bag.read_messages(topics=self.topics):
+		self.data_from_bag = _bag_results_list
+		return _bag_results_list
 
-			if topic == self.imu_topic:
-				_data_obj = self.handle_imu_data(msg)
 
-			elif topic == self.reach_topic:
-				_data_obj = self.handle_reach_data(msg)
+	def stream_data_from_bag(self, output_filename):
+		"""
+		Writes the bag's data to a JSON Lines file as it's read, one
+		{'topic': .., 'time': .., <data object keys>} record per line, so
+		memory use doesn't grow with the bag. Returns the message counts.
+		"""
+		with open(output_filename, 'w') as fileout:
+			for topic, _time, _data_obj in self.iter_data_from_bag():
+				record = {'topic': topic, 'time': _time}
+				record.update(_data_obj)
+				fileout.write(json.dumps(record) + '\n')
 
-			_bag_results_list = self.add_topic_data_to_results(topic, _bag_results_list, _data_obj)
+		print("Data from {} topics streamed from bagfile {} to {}: {}".format(self.topics, self.filename, output_filename, self.message_counts))
+		return self.message_counts
 
-		_bag.close()
 
+	def save_columns_from_bag(self, output_filename):
+		"""
+		Saves the bag's data as typed columns (e.g., fix.time, fix.lat,
+		fix.lon arrays) in a .npz file, see bag_columns module. Returns the
+		message counts.
+		"""
+		columns = TopicColumns()
 
-		print "Data from {} topics has been successfully retrieved from bagfile {}".format(self.topics, self.filename)
-		print "Data can now be accessed by the 'data_from_bag' attribute.."
+		for topic, _time, _data_obj in self.iter_data_from_bag():
+			columns.add(topic, _time, _data_obj)
 
-		self.data_from_bag = _bag_results_list
-		return _bag_results_list
+		columns.save(output_filename)
+
+		print("Data from {} topics in bagfile {} saved as columns: {}".format(self.topics, self.filename, output_filename))
+		return self.message_counts
 
 
 	def save_data_from_bag(self, output_filename):
@@ -78,7 +136,7 @@ class BagHandler:
 		fileout = open(output_filename, 'w')
 		fileout.write(json.dumps(self.data_from_bag))
 		fileout.close()
-		print "Data from bagfile saved: {}".format(output_filename)
+		print("Data from bagfile saved: {}".format(output_filename))
 		return
 
 
@@ -104,6 +162,19 @@ class BagHandler:
 		return reach_result
 
 
+	def handle_generic_data(self, msg):
+		"""
+		Data object for topics without a handler: the message's
+		number and string fields.
+		"""
+		generic_result = {}
+		for slot in getattr(msg, '__slots__', []):
+			value = getattr(msg, slot)
+			if isinstance(value, (numbers.Number, str)):
+				generic_result[slot] = value
+		return generic_result
+
+
 	def quat_to_angle(self, quat):
 		"""
 		Converts quaternion to angle.
@@ -132,8 +203,15 @@ def main(bagfilename, output_filename, topic_list):
 
 	print("Getting {} topics data from {} bagfile".format(topic_list, bagfilename))
 	bagobj = BagHandler(bagfilename, topic_list)
-	bagobj.get_data_from_bag()
-	bagobj.save_data_from_bag(output_filename)
+
+	if output_filename.endswith('.jsonl'):
+		bagobj.stream_data_from_bag(output_filename)  # JSON Lines, written as the bag's read
+	elif output_filename.endswith('.npz'):
+		bagobj.save_columns_from_bag(output_filename)  # typed columns, see bag_columns module
+	else:
+		bagobj.get_data_from_bag()
+		bagobj.save_data_from_bag(output_filename)
+
 	print("Data saved as: {}".format(output_filename))
 		
 
@@ -154,7 +232,7 @@ if __name__ == '__main__':
 	# Example inputs:
 	######################################
 	# bagfilename = sample_course_1.bag
-	# output_filename = course_1.json
+	# output_filename = course_1.json (or course_1.jsonl to stream JSON Lines, course_1.npz for columns)
 	# topic_list = /fix
 	######################################
 
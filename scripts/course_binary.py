@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+
+"""
+Python module for a compact binary course format.
+
+Course JSON files repeat each point three times (dsmPos, decPos, utmPos),
+so loading one means parsing the whole file into a dict per point. A binary
+course file is a fixed size header followed by the course's arrays, which
+are memory mapped (numpy.memmap) when loaded, so loading takes about the
+same time for any size of course.
+
+File layout (little-endian):
+	header (64 bytes): magic b'NAVCOURS', version (uint32), flags (uint32,
+		bit 0 set if lat/lons are included), number of points (uint64),
+		number of rows (uint64), UTM zone number (int32), UTM zone letter (char),
+		row names size (uint32, bytes)
+	row starts: int64 index of each row's first point, one per row
+	row names: JSON list of the rows' names (multirow 'index' values), if
+		any, padded with spaces to a multiple of 8 bytes
+	eastings, northings: float64, one per point each
+	lats, lons: float64, one per point each (if flags bit 0 is set)
+"""
+
+import json
+import struct
+import numpy as np
+
+# Local package requirements:
+from nav_course import NavCourse
+
+
+
+MAGIC = b'NAVCOURS'
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)  # version 1 files have no row names (their size bytes are padding, so 0)
+HEADER_FORMAT = '<8sIIQQicI23x'  # padded to HEADER_SIZE
+HEADER_SIZE = 64
+HAS_LATLONS = 1  # flags bit
+FILE_EXTENSION = '.navc'
+
+
+
+def write_course(filename, easting, northing, lats=None, lons=None, zone_number=0, zone_letter=' ', row_starts=None, row_names=None):
+	"""
+	Writes arrays of eastings and northings (and optionally lat/lons)
+	as a binary course file. row_starts is the index each row starts at,
+	and row_names their names, for multirow courses.
+	"""
+	easting = np.asarray(easting, dtype='<f8')
+	northing = np.asarray(northing, dtype='<f8')
+	row_starts = np.asarray(row_starts if row_starts is not None else [0], dtype='<i8')
+
+	if len(easting) != len(northing):
+		raise Exception("Eastings and northings aren't the same length, course_binary module..")
+
+	names = b''
+	if row_names is not None and any(name is not None for name in row_names):
+		if len(row_names) != len(row_starts):
+			raise Exception("There should be a row name for each row start, course_binary module..")
+		names = json.dumps(list(row_names)).encode('utf-8')
+		names += b' ' * (-len(names) % 8)  # keeps the arrays 8 byte aligned
+
+	flags = 0
+	if lats is not None and lons is not None:
+		flags |= HAS_LATLONS
+
+	header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, flags, len(easting), len(row_starts),
+		int(zone_number), zone_letter.encode('ascii'), len(names))
+
+	with open(filename, 'wb') as fileout:
+		fileout.write(header)
+		fileout.write(row_starts.tobytes())
+		fileout.write(names)
+		fileout.write(easting.tobytes())
+		fileout.write(northing.tobytes())
+		if flags & HAS_LATLONS:
+			fileout.write(np.asarray(lats, dtype='<f8').tobytes())
+			fileout.write(np.asarray(lons, dtype='<f8').tobytes())
+
+
+
+def read_header(filename):
+	"""
+	Reads a binary course file's header into a dict.
+	"""
+	with open(filename, 'rb') as filein:
+		header = filein.read(HEADER_SIZE)
+
+	if len(header) < HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+		raise Exception("{} is not a binary course file..".format(filename))
+
+	magic, version, flags, num_points, num_rows, zone_number, zone_letter, names_size = struct.unpack(HEADER_FORMAT, header)
+
+	if version not in SUPPORTED_VERSIONS:
+		raise Exception("Binary course file version {} not supported (expected {})..".format(version, VERSION))
+
+	return {
+		'version': version,
+		'has_latlons': bool(flags & HAS_LATLONS),
+		'num_points': num_points,
+		'num_rows': num_rows,
+		'zone_number': zone_number,
+		'zone_letter': zone_letter.decode('ascii'),
+		'names_size': names_size
+	}
+
+
+
+def is_binary_course(filename):
+	"""
+	Checks if a file starts with the binary course magic bytes.
+	"""
+	with open(filename, 'rb') as filein:
+		return filein.read(len(MAGIC)) == MAGIC
+
+
+
+def map_arrays(filename, header=None):
+	"""
+	Memory maps a binary course file's arrays. Returns (row starts, row
+	names, float64 array of shape (2 or 4, number of points)), the rows
+	being eastings, northings and, if included, lats and lons.
+	"""
+	header = header or read_header(filename)
+	num_points, num_rows, names_size = header['num_points'], header['num_rows'], header['names_size']
+	num_arrays = 4 if header['has_latlons'] else 2
+
+	with open(filename, 'rb') as filein:
+		filein.seek(HEADER_SIZE)
+		row_starts = np.frombuffer(filein.read(8 * num_rows), dtype='<i8')
+		names = filein.read(names_size)
+
+	if num_rows == 0:
+		row_starts = np.zeros(1, dtype=np.int64)
+
+	row_names = json.loads(names.decode('utf-8')) if names_size else [None] * len(row_starts)
+
+	if num_points == 0:
+		return row_starts, row_names, np.zeros((num_arrays, 0))
+
+	arrays = np.memmap(filename, dtype='<f8', mode='r', offset=HEADER_SIZE + 8 * num_rows + names_size, shape=(num_arrays, num_points))
+
+	return row_starts, row_names, arrays
+
+
+
+def load_course(filename):
+	"""
+	Loads a binary course file as a NavCourse backed by the memory
+	mapped file.
+	"""
+	header = read_header(filename)
+	row_starts, row_names, arrays = map_arrays(filename, header)
+
+	course = NavCourse(arrays[0], arrays[1])
+	course.row_starts = row_starts.astype(np.int64)
+	course.row_names = row_names
+
+	return course
+
+
+
+def load_latlons(filename):
+	"""
+	Memory mapped (lats, lons) arrays of a binary course file, or
+	(None, None) if the file doesn't have them.
+	"""
+	header = read_header(filename)
+
+	if not header['has_latlons']:
+		return None, None
+
+	row_starts, row_names, arrays = map_arrays(filename, header)
+
+	return arrays[2], arrays[3]
+
+
+
+def course_to_binary(course, filename):
+	"""
+	Writes a course JSON object (see NavCourse.from_course) as a binary
+	course file. Lat/lons and the UTM zone are included when the course's
+	flags/goals have them.
+	"""
+	nav_course = NavCourse.from_course(course)
+
+	goals = course.get('flags') or course.get('goals') or []
+	lats, lons = None, None
+	zone_number, zone_letter = 0, ' '
+
+	if goals and all(goal.get('decPos', {}).get('lat') is not None for goal in goals):
+		lats = [goal['decPos']['lat'] for goal in goals]
+		lons = [goal['decPos']['lon'] for goal in goals]
+
+	if goals and goals[0].get('utmPos', {}).get('zone'):
+		zone_number = goals[0]['utmPos']['zone']
+		zone_letter = goals[0]['utmPos']['letter']
+
+	write_course(filename, nav_course.easting, nav_course.northing, lats, lons, zone_number, zone_letter, nav_course.row_starts, nav_course.row_names)
+
+
+
+def load_course_file(filename):
+	"""
+	Loads a course file for the drive nodes: a NavCourse for binary
+	course files, or the JSON object for JSON course files.
+	"""
+	if is_binary_course(filename):
+		return load_course(filename)
+
+	with open(filename, 'r') as coursefile:
+		return json.loads(coursefile.read())
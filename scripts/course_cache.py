@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+"""
+Python module for caching processed courses, so a drive node can start
+driving without re-parsing (and re-nudging) its course file every time.
+
+A cache entry is an .npz file of the course's UTM points, nudged path,
+their rows and their profiles (cumulative arc length, headings, curvature
+and row angles, see nav_course). It's keyed by a hash of the course
+file's contents and the processing parameters (nudge factor, nudge
+spacing, resample spacing), so changing either makes a new entry instead
+of loading a stale one.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+# Local package requirements:
+from nav_course import NavCourse
+from nav_nudge import NavNudge
+import course_binary
+
+
+
+CACHE_VERSION = 3  # bump when the processing below changes
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.ros', 'course_cache')
+
+
+
+def hash_file(filename, chunk_size=65536):
+	"""
+	SHA-1 hex digest of a file's contents.
+	"""
+	sha = hashlib.sha1()
+	with open(filename, 'rb') as filein:
+		chunk = filein.read(chunk_size)
+		while chunk:
+			sha.update(chunk)
+			chunk = filein.read(chunk_size)
+	return sha.hexdigest()
+
+
+
+def get_cache_key(filename, nudge_factor=None, space_factor=0.2, spacing=None):
+	"""
+	Cache key for a course file processed with the given parameters.
+	"""
+	params = "v{};nudge={};space={};resample={}".format(CACHE_VERSION, nudge_factor, space_factor, spacing)
+	return hashlib.sha1("{}:{}".format(hash_file(filename), params).encode('ascii')).hexdigest()
+
+
+
+def build_course(filename, nudge_factor=None, space_factor=0.2, spacing=None):
+	"""
+	Loads and processes a JSON or binary course file. Returns (course,
+	nudged course or None). These are what the drive nodes build when
+	they start up. Each row of a multirow course is nudged on its own, so
+	the nudged course keeps the rows. With a spacing (meters), both are
+	resampled to points that far apart (see NavCourse.resample).
+	"""
+	course = course_binary.load_course_file(filename)
+
+	if not isinstance(course, NavCourse):
+		course = NavCourse.from_course(course)
+
+	nudged_course = None
+	if nudge_factor:
+		nudged_rows, row_names = [], []
+		for row_name, row in course.rows():
+			nudged_row = NavNudge(row, nudge_factor, space_factor).nudged_course
+			if len(nudged_row) == 0:
+				print("Row {} is too short to nudge, leaving it out of the nudged course..".format(row_name))
+				continue
+			nudged_rows.append(nudged_row)
+			row_names.append(row_name)
+		nudged_course = NavCourse.from_rows(nudged_rows, row_names)
+
+	if spacing:
+		course = course.resample(spacing)
+		if nudged_course is not None:
+			nudged_course = nudged_course.resample(spacing)
+
+	return course, nudged_course
+
+
+
+def save_entry(cache_filename, course, nudged_course=None):
+
+	arrays = {
+		'easting': course.easting,
+		'northing': course.northing,
+		'row_starts': course.row_starts,
+		'row_names': json.dumps(course.row_names),
+		'arc_length': course.arc_length,
+		'headings': course.headings,
+		'curvature': course.curvature,
+		'row_angles': course.row_angles,
+		'spacing': np.nan if course.spacing is None else course.spacing
+	}
+
+	if nudged_course is not None:
+		arrays['nudged_easting'] = nudged_course.easting
+		arrays['nudged_northing'] = nudged_course.northing
+		arrays['nudged_row_starts'] = nudged_course.row_starts
+		arrays['nudged_row_names'] = json.dumps(nudged_course.row_names)
+		arrays['nudged_arc_length'] = nudged_course.arc_length
+		arrays['nudged_headings'] = nudged_course.headings
+		arrays['nudged_curvature'] = nudged_course.curvature
+
+	# unique temp file, renamed into place so other nodes don't read a half written entry:
+	fd, tmp_filename = tempfile.mkstemp(suffix='.tmp.npz', dir=os.path.dirname(cache_filename))
+	try:
+		with os.fdopen(fd, 'wb') as fileout:
+			np.savez(fileout, **arrays)
+		os.rename(tmp_filename, cache_filename)
+	except Exception:
+		os.remove(tmp_filename)
+		raise
+
+
+
+def load_entry(cache_filename):
+	"""
+	Loads a cache entry. Returns (course, nudged course or None).
+	"""
+	data = np.load(cache_filename)
+
+	course = NavCourse(data['easting'], data['northing'])
+	course.row_starts = data['row_starts']
+	course.row_names = json.loads(str(data['row_names']))
+	course._arc_length = data['arc_length']
+	course._headings = data['headings']
+	course._curvature = data['curvature']
+	course._row_angles = data['row_angles']
+	course.spacing = None if np.isnan(data['spacing']) else float(data['spacing'])
+
+	nudged_course = None
+	if 'nudged_easting' in data.files:
+		nudged_course = NavCourse(data['nudged_easting'], data['nudged_northing'])
+		nudged_course.row_starts = data['nudged_row_starts']
+		nudged_course.row_names = json.loads(str(data['nudged_row_names']))
+		nudged_course._arc_length = data['nudged_arc_length']
+		nudged_course._headings = data['nudged_headings']
+		nudged_course._curvature = data['nudged_curvature']
+		nudged_course.spacing = course.spacing
+
+	data.close()
+
+	return course, nudged_course
+
+
+
+def load_course(filename, nudge_factor=None, space_factor=0.2, cache_dir=DEFAULT_CACHE_DIR, spacing=None):
+	"""
+	Course for a drive node to follow: the nudged course if there's a
+	nudge_factor, otherwise the course from the file, as a NavCourse
+	(resampled if there's a spacing). Loaded from the cache if this file's
+	been processed with these parameters before, otherwise processed and
+	saved to the cache.
+	"""
+	cache_filename = os.path.join(cache_dir, "{}.npz".format(get_cache_key(filename, nudge_factor, space_factor, spacing)))
+
+	if os.path.exists(cache_filename):
+		try:
+			course, nudged_course = load_entry(cache_filename)
+			print("Loaded course from cache: {}".format(cache_filename))
+			return nudged_course if nudge_factor else course
+		except Exception as e:
+			print("Could not load cached course {}, rebuilding it: {}".format(cache_filename, e))
+
+	course, nudged_course = build_course(filename, nudge_factor, space_factor, spacing)
+
+	try:
+		if not os.path.isdir(cache_dir):
+			os.makedirs(cache_dir)
+		save_entry(cache_filename, course, nudged_course)
+		print("Saved course to cache: {}".format(cache_filename))
+	except (IOError, OSError) as e:
+		print("Could not save course to cache {}: {}".format(cache_dir, e))  # still drives, just not cached
+
+	return nudged_course if nudge_factor else course
@@ -14,8 +14,17 @@ the flags file.
 import utm
 import json
 import sys
+import os
+import glob
+import time
 import csv
-import bag_handler
+import multiprocessing
+import numpy as np
+import bag_columns
+import course_binary
+import course_stream
+import course_simplify
+import projection
 
 
 
@@ -75,6 +84,16 @@ class CourseFileHandler(object):
 
 
 
+	def iter_flags_file(self, filename, units='utm', n_skip=1):
+		"""
+		Yields (easting, northing) ('utm' units) or (lat, lon) ('dec' units)
+		of every n_skip-th flag in a flags JSON file (except the last one),
+		reading the file a chunk at a time instead of loading it.
+		"""
+		return course_stream.iter_course_points(filename, units, n_skip)
+
+
+
 	def save_flags_file(self, filename, updated_flags):
 		"""
 		Save updated flags file.
@@ -83,6 +102,14 @@ class CourseFileHandler(object):
 			fileout.write(json.dumps(updated_flags))
 
 
+	def save_binary_course_file(self, filename, course=None):
+		"""
+		Saves a course (the flags file by default) as a binary
+		course file (see course_binary module).
+		"""
+		course_binary.course_to_binary(course or self.flags, filename)
+
+
 	def convert_dsm_to_dec(self, dsm_pos):
 		"""
 		Input lat/lon format: [degree, minute, second]
@@ -152,10 +179,81 @@ class CourseFileHandler(object):
 
 
 
+	def convert_dsm_to_dec_batch(self, dsm_positions):
+		"""
+		Batch version of convert_dsm_to_dec. Takes a list of dsm position
+		objects and returns arrays of decimal lats and lons.
+		"""
+		results = []
+		for key in ('lat', 'lon'):
+			deg = np.array([pos[key]['deg'] for pos in dsm_positions], dtype=np.float64)
+			mins = np.array([pos[key]['min'] for pos in dsm_positions], dtype=np.float64)
+			secs = np.array([pos[key]['sec'] for pos in dsm_positions], dtype=np.float64)
+			results.append(np.where(deg < 0, deg - mins/60.0 - secs/3600.0, deg + mins/60.0 + secs/3600.0))
+		return results[0], results[1]
+
+
+
+	def convert_dec_to_dsm_batch(self, values):
+		"""
+		Batch version of convert_dec_to_dsm for one column (lats or lons).
+		Returns lists of degrees, minutes and seconds.
+		"""
+		frac = values % 1
+		return (values.astype(np.int64).tolist(),
+				(frac * 60.0).astype(np.int64).tolist(),
+				(((frac * 60.0) % 1) * 60.0).tolist())
+
+
+
+	def convert_dec_to_utm_batch(self, lats, lons):
+		"""
+		Batch version of convert_dec_to_utm. Returns lists of eastings,
+		northings, zones and letters.
+
+		Uses the utm package's numpy support when all the points are in
+		one zone, which gives the same values as converting the points one
+		at a time. Older utm versions without numpy support convert the
+		points one at a time.
+		"""
+		num_points = len(lats)
+
+		if num_points > 0 and getattr(getattr(utm, 'conversion', None), 'use_numpy', False):
+			lat_range, lon_range = (lats.min(), lats.max()), (lons.min(), lons.max())
+			zones = set(utm.latlon_to_zone_number(lat, lon) for lat in lat_range for lon in lon_range)
+			letters = set(utm.latitude_to_zone_letter(lat) for lat in lat_range)
+
+			if len(zones) == 1 and len(letters) == 1:
+				eastings, northings, zone, letter = utm.from_latlon(lats, lons)
+				return eastings.tolist(), northings.tolist(), [int(zone)] * num_points, [letter] * num_points
+
+		utm_vals = [utm.from_latlon(lat, lon) for lat, lon in zip(lats.tolist(), lons.tolist())]
+		return [list(col) for col in zip(*utm_vals)] if utm_vals else ([], [], [], [])
+
+
+
+	def convert_utm_to_dec_batch(self, utm_positions):
+		"""
+		Batch version of convert_utm_to_dec. Returns arrays of lats and lons.
+		"""
+		eastings = np.array([pos['easting'] for pos in utm_positions], dtype=np.float64)
+		northings = np.array([pos['northing'] for pos in utm_positions], dtype=np.float64)
+		zones = set((pos['zone'], pos['letter']) for pos in utm_positions)
+
+		if len(zones) == 1 and getattr(getattr(utm, 'conversion', None), 'use_numpy', False):
+			zone, letter = zones.pop()
+			return utm.to_latlon(eastings, northings, zone, letter)
+
+		dec_vals = [utm.to_latlon(pos['easting'], pos['northing'], pos['zone'], pos['letter']) for pos in utm_positions]
+		return np.array([val[0] for val in dec_vals]), np.array([val[1] for val in dec_vals])
+
+
+
 	def fill_out_flags_file(self):
 		"""
-		Loops through flags JSON and fills in any formats
-		that aren't currently there.
+		Fills in any position formats that aren't currently in the
+		flags JSON. Conversions are done a column (e.g., all lats) at
+		a time, see the *_batch functions.
 		"""
 		if not self.flags:
 			raise "No flags specificed. Run read_flags_file(filename) first.."
@@ -172,32 +270,79 @@ class CourseFileHandler(object):
 			print("STILL NAMED GOALS, TODO: CHANGE NAME TO FLAGS")
 			flags = self.flags.get('goals')
 
-		for flag in flags:
+		if flag_units == 'dsm':
+			# flags file has DSM lat/lons, add dec and utm..
+			lats, lons = self.convert_dsm_to_dec_batch([flag['dsmPos'] for flag in flags])
+			lat_list, lon_list = lats.tolist(), lons.tolist()
+			for i, flag in enumerate(flags):
+				dec_vals = {'lat': lat_list[i], 'lon': lon_list[i]}
+				flag['decPos'] = dict((key, dec_vals[key]) for key in flag['dsmPos'])  # keeps key order of dsmPos
+			self.fill_out_utm_batch(flags, lats, lons)  # UTM conversion uses dec lat/lons
+
+		elif flag_units == 'dec':
+			# flags file has decimal lat/lons, add dsm and utm..
+			lats = np.array([flag['decPos']['lat'] for flag in flags], dtype=np.float64)
+			lons = np.array([flag['decPos']['lon'] for flag in flags], dtype=np.float64)
+			self.fill_out_dsm_batch(flags, lats, lons)
+			self.fill_out_utm_batch(flags, lats, lons)
+
+		elif flag_units == 'utm':
+			# flags file has UTM positions, add dec and dsm..
+			lats, lons = self.convert_utm_to_dec_batch([flag['utmPos'] for flag in flags])
+			lat_list, lon_list = lats.tolist(), lons.tolist()
+			for i, flag in enumerate(flags):
+				flag['decPos'] = {
+					'lat': lat_list[i],
+					'lon': lon_list[i]
+				}
+			self.fill_out_dsm_batch(flags, lats, lons)
 
-			if flag_units == 'dsm':
-				# flags file has DSM lat/lons, add dec and utm..
-				flag['decPos'] = self.convert_dsm_to_dec(flag['dsmPos'])
-				flag['utmPos'] = self.convert_dec_to_utm(flag['decPos'])  # UTM conversion uses dec lat/lons
+		return flags  # returning updated flags
 
 
-			elif flag_units == 'dec':
-				# flags file has decimal lat/lons, add dsm and utm..
-				flag['dsmPos'] = self.convert_dec_to_dsm(flag['decPos'])
-				flag['utmPos'] = self.convert_dec_to_utm(flag['decPos'])
 
-			elif flag_units == 'utm':
-				# flags file has UTM positions, add dec and dsm..
-				flag['decPos'] = self.convert_utm_to_dec(flag['utmPos'])
-				flag['dsmPos'] = self.convert_dec_to_dsm(flag['decPos'])
+	def fill_out_dsm_batch(self, flags, lats, lons):
+		"""
+		Sets 'dsmPos' of each flag from arrays of decimal lats and lons.
+		"""
+		columns = {
+			'lat': self.convert_dec_to_dsm_batch(lats),
+			'lon': self.convert_dec_to_dsm_batch(lons)
+		}
+		for i, flag in enumerate(flags):
+			new_pos = {}
+			for key in flag['decPos']:
+				# keeps key order of decPos, like convert_dec_to_dsm
+				degs, mins, secs = columns[key]
+				new_pos[key] = {
+					'deg': degs[i],
+					'min': mins[i],
+					'sec': secs[i]
+				}
+			flag['dsmPos'] = new_pos
 
-		return flags  # returning updated flags
+
+
+	def fill_out_utm_batch(self, flags, lats, lons):
+		"""
+		Sets 'utmPos' of each flag from arrays of decimal lats and lons.
+		"""
+		eastings, northings, zones, letters = self.convert_dec_to_utm_batch(lats, lons)
+		for i, flag in enumerate(flags):
+			flag['utmPos'] = {
+				'easting': eastings[i],
+				'northing': northings[i],
+				'zone': zones[i],
+				'letter': letters[i]
+			}
 
 
 
-	def parse_bag_data_to_flags(self, n_skip=1):
+	def parse_bag_data_to_flags(self, n_skip=1, tolerance=None):
 		"""
 		Takes /fix data from bag file handler (e.g., {"topic": "/fix", "data": [{"lat": "", "lon": ""}]}),
-		and parses it to the flag JSON format.
+		and parses it to the flag JSON format. If there's a tolerance (meters),
+		the flags are simplified with course_simplify too.
 		"""
 		bag_data_list = self.flags
 		parsed_results = {'flags': [], 'units': "dec"}  # assuming /fix topic is dec lat/lon..
@@ -219,37 +364,79 @@ class CourseFileHandler(object):
 			}
 			parsed_results['flags'].append(parsed_data_obj)
 
+		if tolerance:
+			parsed_results['flags'] = course_simplify.simplify_flags(parsed_results['flags'], tolerance)
+
 		self.flags = parsed_results  # set flags to parsed results
 
 
 
-	def convert_course_to_latlon_csv(self, input_filename, output_filename, n_skip=1):
+	def build_flags_from_columns(self, columns_filename, topic='/fix', n_skip=1, tolerance=None):
 		"""
-		Converts a course in JSON format to a CSV of lat,lons.
+		Like parse_bag_data_to_flags, but reads the lat/lon columns of a
+		.npz file from BagHandler.save_columns_from_bag instead of a JSON
+		list of lat/lon objects.
 		"""
-		_csv_data = []
+		columns = bag_columns.load_topic_columns(columns_filename, topic)
+		lats, lons = columns['lat'].tolist(), columns['lon'].tolist()
+
+		parsed_results = {'flags': [], 'units': "dec"}
+
+		for i in range(0, len(lats) - 1, n_skip):
+			parsed_results['flags'].append({
+				'index': i,
+				'decPos': {
+					'lat': lats[i],
+					'lon': lons[i]
+				}
+			})
 
-		print("Opening course file..")
-		filein= open(input_filename, 'r')
-		file_data = filein.read()
-		filein.close()
+		if tolerance:
+			parsed_results['flags'] = course_simplify.simplify_flags(parsed_results['flags'], tolerance)
 
-		course_json = json.loads(file_data)  # converts json string to object		
+		self.flags = parsed_results
 
-		print("Building CSV file of lat, lons..")
-		for i in range(0, len(course_json.get('flags')) - 1, n_skip):
-			pos_obj = course_json['flags'][i]
-			_lat = pos_obj['decPos']['lat']
-			_lon = pos_obj['decPos']['lon']
-			# _lat = pos_obj['utmPos']['easting']
-			# _lon = pos_obj['utmPos']['northing']
-			_csv_data.append([_lat, _lon])
 
 
-		print("Writing data to CSV: {}".format(output_filename))
-		fileout = open(output_filename, 'wb')
+	def convert_bag_to_course(self, bag_filename, output_filename, n_skip=1, topic='/fix', tolerance=None):
+		"""
+		Converts a bag's GPS (/fix) data to a filled out course file,
+		keeping the data as columns (<bag name>.npz) for analysis. Returns the
+		number of GPS messages read. tolerance (meters) simplifies the course,
+		see course_simplify.
+		"""
+		import bag_handler  # needs rosbag, so it's only imported for bag conversions
+
+		columns_filename = "{}.npz".format(bag_filename.split('.bag')[0])
+
+		bagobj = bag_handler.BagHandler(bag_filename, [topic])
+		message_counts = bagobj.save_columns_from_bag(columns_filename)
+
+		print("GPS data columns file created: {}".format(columns_filename))
+
+		self.build_flags_from_columns(columns_filename, topic, n_skip, tolerance)  # builds flags from lat/lon columns before filling out position data..
+
+		updated_flags = self.fill_out_flags_file()
+		self.flags['flags'] = updated_flags
+
+		print("Saving file as: {}..".format(output_filename))
+		self.save_flags_file(output_filename, self.flags)
+
+		return message_counts.get(topic, 0)
+
+
+
+	def convert_course_to_latlon_csv(self, input_filename, output_filename, n_skip=1):
+		"""
+		Converts a course in JSON format to a CSV of lat,lons.
+		"""
+		print("Writing lat, lons from {} to CSV: {}".format(input_filename, output_filename))
+		fileout = open(output_filename, 'w', newline='') if sys.version_info[0] >= 3 else open(output_filename, 'w')  # csv module does its own line endings
 		csvwriter = csv.writer(fileout)
-		csvwriter.writerows(_csv_data)
+
+		for _lat, _lon in self.iter_flags_file(input_filename, 'dec', n_skip):
+			csvwriter.writerow([_lat, _lon])  # streamed from the course file a flag at a time
+
 		fileout.close()
 
 		print("Done.")
@@ -257,52 +444,320 @@ class CourseFileHandler(object):
 
 
 
-	def convert_latlon_csv_to_course(self, input_filename, output_filename, n_skip=1):
+	def convert_latlon_csv_to_course(self, input_filename, output_filename, n_skip=1, chunk_size=5000, tolerance=None):
 		"""
-		Converts a CSV of lat, lons to a JSON formatted course.
+		Converts a CSV of lat, lons to a JSON formatted course, or to a
+		binary course (see course_binary module) if output_filename ends
+		with .navc. The CSV is read, filled out and written a chunk of rows
+		at a time, printing progress counts as it goes. If there's a
+		tolerance (meters), each chunk is simplified with course_simplify
+		(chunks keep their end points, so the tolerance holds across them).
 		"""
-		print("Opening course file..")
-		filein= open(input_filename, 'r')
-		file_data = filein.read()
-		filein.close()
+		binary = output_filename.endswith(course_binary.FILE_EXTENSION)
+		columns = {'easting': [], 'northing': [], 'lat': [], 'lon': []}  # binary course arrays
+		zone = None
+		count = 0
 
-		json_obj = {}
-		json_obj['date'] = ""
-		json_obj['location'] = ""
-		json_obj['units'] = "dec"
-		json_obj['flags'] = []
+		print("Building course file {} from lat, lons in {}..".format(output_filename, input_filename))
 
-		latlon_pairs = file_data.split('\n')
+		fileout = None  # binary courses are written by course_binary once all the columns are read
 
-		print("Lat/lons: {}".format(file_data))		
+		if not binary:
+			fileout = open(output_filename, 'w')
+			fileout.write('{"date": "", "location": "", "units": "dec", "flags": [')
 
-		print("Building course file from lat, lons..")
-		for i in range(0, len(latlon_pairs) - 1, n_skip):
-			_lat = float(latlon_pairs[i].split(',')[0])
-			_lon = float(latlon_pairs[i].split(',')[1])
-			_pos_obj = {
-				'index': str(i),
-				'decPos': {
-					'lat': _lat,
-					'lon': _lon
-				}
-			}
-			json_obj['flags'].append(_pos_obj)
+		for flags in self.iter_latlon_csv_flags(input_filename, n_skip, chunk_size):
 
-		self.flags = json_obj  # sets flags object to fill out remaining data
-		self.fill_out_flags_file()  # fills out pos objects with dsm and utm formats
+			if tolerance:
+				flags = course_simplify.simplify_flags(flags, tolerance)
 
-		print("Writing course file to: {}".format(output_filename))
-		fileout = open(output_filename, 'wb')
-		fileout.write(json.dumps(json_obj))
-		fileout.close()
+			self.flags = {'units': "dec", 'flags': flags}
+			self.fill_out_flags_file()  # fills out pos objects with dsm and utm formats
+
+			if binary:
+				columns['easting'].extend(flag['utmPos']['easting'] for flag in flags)
+				columns['northing'].extend(flag['utmPos']['northing'] for flag in flags)
+				columns['lat'].extend(flag['decPos']['lat'] for flag in flags)
+				columns['lon'].extend(flag['decPos']['lon'] for flag in flags)
+				zone = zone or (flags[0]['utmPos']['zone'], flags[0]['utmPos']['letter'])
+			else:
+				fileout.write((', ' if count > 0 else '') + ', '.join(json.dumps(flag) for flag in flags))
+
+			count += len(flags)
+			print("{} lat/lons converted..".format(count))
 
+		if binary:
+			zone = zone or (0, ' ')
+			course_binary.write_course(output_filename, columns['easting'], columns['northing'],
+				columns['lat'], columns['lon'], zone[0], zone[1])
+		else:
+			fileout.write(']}')
+			fileout.close()
+
+		self.flags = None  # only the last chunk's flags were kept
+
+		print("Wrote {} flags to course file: {}".format(count, output_filename))
 		print("Done.")
-		return	
+		return
 
-			
 
 
+	def iter_latlon_csv_flags(self, input_filename, n_skip=1, chunk_size=5000):
+		"""
+		Reads a CSV of lat, lons a line at a time, yielding lists of up to
+		chunk_size flags ({'index': "line number", 'decPos': {..}}) for every
+		n_skip-th line. Like splitting the file by newlines and leaving out
+		the last piece, a last line without a newline is skipped.
+		"""
+		flags = []
+
+		with open(input_filename, 'r') as filein:
+			for i, line in enumerate(filein):
+
+				if i % n_skip != 0 or not line.endswith('\n'):
+					continue
+
+				_lat, _lon = line.split(',')[0:2]
+				flags.append({
+					'index': str(i),
+					'decPos': {
+						'lat': float(_lat),
+						'lon': float(_lon)
+					}
+				})
+
+				if len(flags) >= chunk_size:
+					yield flags
+					flags = []
+
+		if flags:
+			yield flags
+
+
+
+	def collapse_stationary_points(self, input_filename, output_filename, distance=0.1, duration=2.0):
+		"""
+		Collapses runs of points recorded while the rover sat still (see
+		course_simplify.collapse_stationary_indices) in a course JSON file
+		(each row of a multirow course on its own) or a CSV of lat, lons, and
+		saves the result to output_filename. Returns (number of points,
+		number removed).
+		"""
+		if input_filename.endswith('.csv'):
+			with open(input_filename, 'r') as filein:
+				lines = [line for line in filein if line.strip()]
+			latlons = np.array([line.split(',')[0:2] for line in lines], dtype=np.float64).reshape(-1, 2)
+			easting, northing = np.zeros(0), np.zeros(0)
+			if len(latlons) > 0:
+				utm_projection = projection.UTMProjection.from_latlon(latlons[0,0], latlons[0,1])
+				easting, northing = utm_projection.to_utm_batch(latlons[:,0], latlons[:,1])
+			indices = course_simplify.collapse_stationary_indices(easting, northing, distance, duration)
+			with open(output_filename, 'w') as fileout:
+				fileout.write(''.join(lines[i] for i in indices))
+			return len(lines), len(lines) - len(indices)
+
+		with open(input_filename, 'r') as filein:
+			course = json.loads(filein.read())
+
+		if course.get('rows') is not None:
+			num_points, removed = 0, 0
+			for row_obj in course['rows']:
+				row_points, row_removed = self.collapse_stationary_row(row_obj, distance, duration)
+				num_points += row_points
+				removed += row_removed
+		else:
+			num_points, removed = self.collapse_stationary_course(course, distance, duration)
+
+		self.save_flags_file(output_filename, course)
+
+		return num_points, removed
+
+
+
+	def collapse_stationary_course(self, course, distance=0.1, duration=2.0):
+		"""
+		Collapses stationary points in a single course object's flags/goals,
+		in place. Returns (number of points, number removed).
+		"""
+		key = 'flags' if course.get('flags') else 'goals'
+		if not course.get(key):
+			raise Exception("Could not find flags or goals in course..")
+
+		num_points = len(course[key])
+		course[key], removed = course_simplify.collapse_stationary_flags(course[key], distance, duration)
+
+		return num_points, removed
+
+
+
+	def collapse_stationary_row(self, row_obj, distance=0.1, duration=2.0):
+		"""
+		Collapses stationary points in a multirow course's row ({'index': ..,
+		'row': ..}), in place. The row is a single course object or a list
+		of [easting, northing] pairs (taken to be at the Reach's GPS rate,
+		see course_simplify.DEFAULT_RATE). Returns (number of points, number
+		removed).
+		"""
+		row = row_obj.get('row')
+
+		if isinstance(row, dict):
+			return self.collapse_stationary_course(row, distance, duration)
+
+		points = np.asarray(row, dtype=np.float64).reshape(-1, 2)
+		indices = course_simplify.collapse_stationary_indices(points[:,0], points[:,1], distance, duration)
+		row_obj['row'] = [row[i] for i in indices]
+
+		return len(points), len(points) - len(indices)
+
+
+
+
+
+
+
+# Batch mode: runs an option's conversion on many files with a process pool.
+
+batch_inputs = {1: '*.csv', 2: '*.json', 3: '*.bag', 5: '*.json'}  # input files for a directory, by option
+
+
+
+def get_batch_output_filename(input_filename, option):
+	"""
+	Output filename for a batch conversion, e.g., row_1_latlons.csv ->
+	row_1_course.json (option 1), row_1_course.json ->
+	row_1_course_latlons.csv (option 2, named after the whole input so it
+	can't clash with a recorded row_1_latlons.csv), course_1.bag ->
+	course_1_filled.json (option 3), row_1_course.json -> row_1_course.navc
+	(option 5).
+	"""
+	base = os.path.splitext(input_filename)[0]
+
+	if option == 3:
+		return base + '_filled.json'
+
+	if option == 1:
+		return (base[:-len('_latlons')] if base.endswith('_latlons') else base) + '_course.json'
+	elif option == 2:
+		return base + '_latlons.csv'
+	elif option == 5:
+		return base + course_binary.FILE_EXTENSION
+
+	raise Exception("Batch mode supports options {}".format(sorted(batch_inputs.keys())))
+
+
+
+def find_batch_inputs(pattern, option):
+	"""
+	Input files for a batch: a directory's files for the option
+	(see batch_inputs), or the files matching a glob pattern.
+	"""
+	if os.path.isdir(pattern):
+		pattern = os.path.join(pattern, batch_inputs[option])
+	return sorted(glob.glob(pattern))
+
+
+
+def is_up_to_date(input_filename, output_filename):
+	"""
+	True if the output exists and isn't older than the input, in which case
+	the batch leaves it alone.
+	"""
+	return os.path.exists(output_filename) and os.path.getmtime(output_filename) >= os.path.getmtime(input_filename)
+
+
+
+def convert_batch_file(task):
+	"""
+	Runs one batch conversion (in a pool worker). task is (option,
+	input_filename, output_filename, n_skip, tolerance). The conversion
+	writes to a temp file next to the output, which is renamed to the
+	output only if it succeeds, so a failed conversion leaves any existing
+	output as it was. Returns (input_filename, output_filename, seconds,
+	error message or None, number of bag messages read or None).
+	"""
+	option, input_filename, output_filename, n_skip, tolerance = task
+
+	output_dir, output_name = os.path.split(output_filename)
+	name, ext = os.path.splitext(output_name)
+	tmp_filename = os.path.join(output_dir, ".{}.{}.tmp{}".format(name, os.getpid(), ext))  # hidden from the batch's globs, same extension (e.g., .navc outputs are written as binary courses)
+
+	_stdout = sys.stdout
+	sys.stdout = open(os.devnull, 'w')  # conversions print a lot, and workers would interleave
+	start = time.time()
+	error = None
+	message_count = None
+
+	try:
+		cfh = CourseFileHandler()
+		if option == 3:
+			message_count = cfh.convert_bag_to_course(input_filename, tmp_filename, n_skip, tolerance=tolerance)
+		elif option == 1:
+			cfh.convert_latlon_csv_to_course(input_filename, tmp_filename, n_skip, tolerance=tolerance)
+		elif option == 2:
+			cfh.convert_course_to_latlon_csv(input_filename, tmp_filename, n_skip)
+		elif option == 5:
+			cfh.read_flags_file(input_filename)
+			cfh.save_binary_course_file(tmp_filename)
+		os.rename(tmp_filename, output_filename)
+	except Exception as e:
+		error = "{}: {}".format(type(e).__name__, e)
+	finally:
+		if os.path.exists(tmp_filename):
+			os.remove(tmp_filename)  # only the batch's own temp file, never an existing output
+		sys.stdout.close()
+		sys.stdout = _stdout
+
+	return input_filename, output_filename, time.time() - start, error, message_count
+
+
+
+def run_batch(pattern, option, n_skip=1, processes=None, tolerance=None):
+	"""
+	Converts every input file for a glob pattern or directory with a
+	process pool, skipping ones whose output already exists and isn't older
+	than the input (and ones whose output is another of the inputs), then
+	prints a timing summary. Returns the list of results (see
+	convert_batch_file).
+	"""
+	tasks, skipped = [], []
+	input_filenames = find_batch_inputs(pattern, option)
+
+	for input_filename in input_filenames:
+		output_filename = get_batch_output_filename(input_filename, option)
+		if is_up_to_date(input_filename, output_filename):
+			skipped.append(input_filename)
+		elif output_filename in input_filenames:
+			print("Skipping {}, its output {} is one of the inputs..".format(input_filename, output_filename))
+			skipped.append(input_filename)
+		else:
+			tasks.append((option, input_filename, output_filename, n_skip, tolerance))
+
+	print("Batch option {}: {} files to convert, {} up to date..".format(option, len(tasks), len(skipped)))
+
+	results = []
+	start = time.time()
+
+	if tasks:
+		pool = multiprocessing.Pool(processes, maxtasksperchild=1 if option == 3 else None)  # a fresh process per bag
+		try:
+			for result in pool.imap_unordered(convert_batch_file, tasks):
+				results.append(result)
+				messages = ", {} messages, {:.0f} messages/s".format(result[4], result[4] / max(result[2], 1e-9)) if result[4] is not None else ""
+				print("{} -> {} ({:.2f}s{}){}".format(result[0], result[1], result[2], messages, ", FAILED: " + result[3] if result[3] else ""))
+		finally:
+			pool.close()
+			pool.join()
+
+	failed = [result for result in results if result[3]]
+	total_time = time.time() - start
+	print("Batch summary: {} converted, {} failed, {} skipped, {:.2f}s total ({:.2f}s of conversions)".format(
+		len(results) - len(failed), len(failed), len(skipped), total_time, sum(result[2] for result in results)))
+
+	message_counts = [result[4] for result in results if result[4] is not None]
+	if message_counts:
+		print("Bag messages: {} read, {:.0f} messages/s overall".format(sum(message_counts), sum(message_counts) / max(total_time, 1e-9)))
+
+	return results
 
 
 
@@ -315,13 +770,40 @@ if __name__ == '__main__':
 
 	Inputs:
 	  1. option (int):
-	    1 - Create a course file from a CSV of lat/lons.
+	    1 - Create a course file (JSON, or binary if output is .navc) from a CSV of lat/lons.
 	    2 - Create a CSV of lat/lons from course file.
 	    3 - Convert bag file to course.
 	    4 - Fill out existing course file.
+	    5 - Convert course file to a binary course file (.navc).
+	    6 - Batch mode, runs option 1, 2, 3 or 5 on many files in parallel.
+	    7 - Collapse stationary points (e.g., before a drive starts) in course files or CSVs of lat/lons.
 	  2. input_filename (string).
-	  3. output_filename (string, for options 1-3).
+	  3. output_filename (string, for options 1-3 and 5).
 	  4. n_skip (int, for options 1-3) - number of indices to skip when building file.
+	  5. tolerance (float, optional, for options 1 and 3) - simplifies the course,
+	     keeping it within this many meters of the recorded path (see course_simplify).
+
+	Batch mode inputs:
+	  1. 6
+	  2. glob pattern (quoted, e.g., "courses/peanut_field_2018/row_*_latlons.csv") or directory.
+	  3. option to run on each file (1, 2, 3 or 5). Output files are named after
+	     the inputs, e.g., row_1_latlons.csv -> row_1_course.json,
+	     row_1_course.json -> row_1_course_latlons.csv or
+	     course_1.bag -> course_1_filled.json. Files whose output exists and
+	     isn't older than the input are skipped, and an output is only
+	     replaced once its conversion succeeds.
+	  4. n_skip (int, optional).
+	  5. number of processes (int, optional, defaults to number of CPUs).
+	  6. tolerance (float, optional, for options 1 and 3).
+
+	Stationary points inputs:
+	  1. 7
+	  2. course file or CSV, glob pattern (quoted) or directory (of course files).
+	     Each file's output is saved as <name>_collapsed.json/.csv.
+	  3. distance (float, optional, meters, default 0.1) - points within this distance of
+	     a run's first point are in the run.
+	  4. duration (float, optional, seconds, default 2.0) - runs lasting at least this long
+	     are collapsed to their first point.
 	"""
 
 	
@@ -344,14 +826,11 @@ if __name__ == '__main__':
 		input_filename = sys.argv[2]
 		output_filename = sys.argv[3]
 		n_skip = int(sys.argv[4])
+		tolerance = float(sys.argv[5]) if len(sys.argv) > 5 else None
 		
-		cfh.convert_latlon_csv_to_course(input_filename, output_filename, n_skip)
-		
-		# # Batch Mode:
-		# for i in range(4, 12):
-		# 	input_filename = "../courses/peanut_field_2018/row_{}_latlons.csv".format(i)
-		# 	output_filename = "../courses/peanut_field_2018/row_{}_course.json".format(i)
-		# 	cfh.convert_latlon_csv_to_course(input_filename, output_filename)
+		cfh.convert_latlon_csv_to_course(input_filename, output_filename, n_skip, tolerance=tolerance)
+
+		# # Batch Mode: see option 6.
 
 
 	elif option == 2:
@@ -369,21 +848,11 @@ if __name__ == '__main__':
 		input_filename = sys.argv[2]  # get filename from command line
 		output_filename = sys.argv[3]
 		n_skip = int(sys.argv[4])  # number of indices to skip when building course file (e.g., 5)
+		tolerance = float(sys.argv[5]) if len(sys.argv) > 5 else None  # meters, e.g., 0.05
 
 		print("Assuming GPS topic is /fix in bag file..")
 		output_filename = "{}_filled.json".format(input_filename.split('.bag')[0])  # saves as same input_filename but w/ .json extension..
-		bag_handler.main(input_filename, output_filename, ["/fix"])  # NOTE: will save output file to path as output_filename..
-
-		print("Filled out GPS data file created: {}".format(output_filename))
-
-		cfh.read_flags_file(output_filename)  # sets updated/filled data file as flags file..
-		cfh.parse_bag_data_to_flags(n_skip)  # parses bag_handler data to flags file format before filling out position data..
-		
-		updated_flags = cfh.fill_out_flags_file()
-		cfh.flags['flags'] = updated_flags
-
-		print("Saving file as: {}..".format(output_filename))
-		cfh.save_flags_file(output_filename, cfh.flags)
+		cfh.convert_bag_to_course(input_filename, output_filename, n_skip, tolerance=tolerance)  # also keeps bag's /fix data as columns (.npz) for analysis
 
 
 
@@ -400,4 +869,53 @@ if __name__ == '__main__':
 
 
 
+	elif option == 5:
+		# # CONVERTS COURSE FILE TO BINARY COURSE FILE:
+		input_filename = sys.argv[2]
+		output_filename = sys.argv[3]
+
+		cfh.read_flags_file(input_filename)
+		cfh.save_binary_course_file(output_filename)
+		print(">>> Saved binary course file as: {}..".format(output_filename))
+
+
+
+	elif option == 6:
+		# # BATCH MODE, CONVERTS FILES MATCHING A GLOB OR IN A DIRECTORY:
+		pattern = sys.argv[2]
+		batch_option = int(sys.argv[3])
+		n_skip = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+		processes = int(sys.argv[5]) if len(sys.argv) > 5 else None
+		tolerance = float(sys.argv[6]) if len(sys.argv) > 6 else None
+
+		run_batch(pattern, batch_option, n_skip, processes, tolerance)
+
+
+
+	elif option == 7:
+		# # COLLAPSES STATIONARY POINTS IN COURSE FILES:
+		pattern = sys.argv[2]
+		distance = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+		duration = float(sys.argv[4]) if len(sys.argv) > 4 else 2.0
+
+		total_points, total_removed, skipped = 0, 0, []
+		for input_filename in sorted(glob.glob(os.path.join(pattern, '*.json') if os.path.isdir(pattern) else pattern)):
+			base, ext = os.path.splitext(input_filename)
+			if base.endswith('_collapsed'):
+				continue
+			output_filename = base + '_collapsed' + ext
+			try:
+				num_points, removed = cfh.collapse_stationary_points(input_filename, output_filename, distance, duration)
+			except Exception as e:
+				skipped.append(input_filename)
+				print("{}: SKIPPED, {}: {}".format(input_filename, type(e).__name__, e))
+				continue
+			total_points += num_points
+			total_removed += removed
+			print("{}: removed {} of {} points -> {}".format(input_filename, removed, num_points, output_filename))
+
+		print("Removed {} of {} points in total, {} files skipped.".format(total_removed, total_points, len(skipped)))
+
+
+
 	print("Done.")
\ No newline at end of file
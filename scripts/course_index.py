@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+"""
+Python module for a spatial index over course points.
+
+Course points (e.g., [easting, northing] pairs) are bucketed into a uniform
+grid of square cells once, when the course is loaded. Nearest-point and
+radius queries then only look at the cells around the robot instead of
+every point in the course, which matters for whole-field courses where
+points from many rows are packed closely together.
+"""
+
+import math
+import numpy as np
+
+
+
+class CourseIndex(object):
+	"""
+	Uniform grid index over a course's [easting, northing] points.
+	Indices returned by the queries are indices into the points the
+	index was built from.
+	"""
+
+	def __init__(self, points, cell_size=1.0):
+
+		self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)  # [[easting, northing], ..]
+		self.cell_size = float(cell_size)  # width of grid cells (units: meters)
+		self.cells = {}  # (col, row) cell -> array of point indices in that cell
+
+		if len(self.points) < 1:
+			self.origin = np.zeros(2)
+			self.max_ring = 0
+			return
+
+		self.origin = self.points.min(axis=0)
+		cell_coords = np.floor((self.points - self.origin) / self.cell_size).astype(np.int64)
+		self.max_ring = int(cell_coords.max()) + 1  # rings needed to cover the whole grid from any cell in it
+
+		# Groups point indices by cell (stable sort keeps indices ascending within a cell):
+		order = np.lexsort((cell_coords[:,1], cell_coords[:,0]))
+		sorted_cells = cell_coords[order]
+		breaks = np.flatnonzero(np.any(np.diff(sorted_cells, axis=0) != 0, axis=1)) + 1
+		for group in np.split(order, breaks):
+			col, row = cell_coords[group[0]]
+			self.cells[(int(col), int(row))] = np.sort(group)
+
+
+
+	def __len__(self):
+		return len(self.points)
+
+
+
+	def get_cell(self, position):
+		"""
+		Grid cell (col, row) that a position falls in.
+		"""
+		return (int(math.floor((position[0] - self.origin[0]) / self.cell_size)),
+				int(math.floor((position[1] - self.origin[1]) / self.cell_size)))
+
+
+
+	def get_ring_indices(self, cell, ring):
+		"""
+		Point indices in the square ring of cells that's 'ring' cells
+		away from the given cell (ring 0 is the cell itself).
+		"""
+		col, row = cell
+		groups = []
+
+		for i in range(col - ring, col + ring + 1):
+			for j in range(row - ring, row + ring + 1):
+				if ring > 0 and abs(i - col) != ring and abs(j - row) != ring:
+					continue  # inner cell, already searched
+				group = self.cells.get((i, j))
+				if group is not None:
+					groups.append(group)
+
+		if not groups:
+			return np.empty(0, dtype=np.int64)
+
+		return np.concatenate(groups)
+
+
+
+	def filter_indices(self, indices, min_index=0, max_index=None):
+		"""
+		Keeps the point indices in the range min_index <= index < max_index.
+		"""
+		if min_index > 0:
+			indices = indices[indices >= min_index]
+		if max_index is not None:
+			indices = indices[indices < max_index]
+		return indices
+
+
+
+	def nearest(self, position, min_index=0, max_index=None):
+		"""
+		Finds the closest course point (with min_index <= index < max_index)
+		to a position. Returns (index, distance), or (None, None) if there
+		are no points in that range.
+		"""
+		cell = self.get_cell(position)
+
+		# Rings needed to reach the grid from outside of it, plus the grid itself:
+		outside = max(0, -cell[0], -cell[1], cell[0] - self.max_ring, cell[1] - self.max_ring)
+		last_ring = outside + self.max_ring
+
+		best_index, best_dist = None, None
+		ring = 0
+
+		while ring <= last_ring:
+
+			candidates = self.filter_indices(self.get_ring_indices(cell, ring), min_index, max_index)
+
+			if len(candidates) > 0:
+				d = np.hypot(self.points[candidates,0] - position[0], self.points[candidates,1] - position[1])
+				i = int(np.argmin(d))
+				# ties go to the lowest index, same as a linear scan:
+				tied = candidates[d == d[i]]
+				if best_dist is None or d[i] < best_dist or (d[i] == best_dist and tied.min() < best_index):
+					best_index, best_dist = int(tied.min()), float(d[i])
+
+			# points in the next ring out are at least ring*cell_size away:
+			if best_dist is not None and best_dist < ring * self.cell_size:
+				break
+
+			ring += 1
+
+		return best_index, best_dist
+
+
+
+	def within(self, position, radius, min_index=0, max_index=None):
+		"""
+		Indices (ascending) of the course points within a radius of a position.
+		"""
+		col0, row0 = self.get_cell((position[0] - radius, position[1] - radius))
+		col1, row1 = self.get_cell((position[0] + radius, position[1] + radius))
+
+		groups = []
+		for i in range(col0, col1 + 1):
+			for j in range(row0, row1 + 1):
+				group = self.cells.get((i, j))
+				if group is not None:
+					groups.append(group)
+
+		if not groups:
+			return np.empty(0, dtype=np.int64)
+
+		candidates = self.filter_indices(np.concatenate(groups), min_index, max_index)
+
+		d = np.hypot(self.points[candidates,0] - position[0], self.points[candidates,1] - position[1])
+
+		return np.sort(candidates[d <= radius])
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+
+"""
+Python module for simplifying recorded courses by their geometry instead
+of keeping every n_skip-th point.
+
+simplify_indices runs Douglas-Peucker on a course's eastings/northings:
+a stretch of points is replaced by the segment between its ends if none of
+them is further than `tolerance` meters from it, otherwise it's split at
+the furthest point and each half is checked the same way. Straight
+stretches end up as a couple of points while curves keep their detail,
+and every recorded point stays within tolerance of the simplified course.
+The first and last points are always kept.
+
+collapse_stationary_indices finds runs of points recorded while the rover
+sat still (e.g., before a drive starts), all within a distance of the run's
+first point for at least a duration, and keeps only that first point.
+"""
+
+import numpy as np
+
+# Local package requirements:
+import projection
+
+
+
+DEFAULT_RATE = 5.0  # Hz, Reach GPS rate, for courses without times
+
+
+
+def segment_distances(easting, northing, start, end):
+	"""
+	Distances (meters) of points start+1 to end-1 from the segment between
+	points start and end.
+	"""
+	ax, ay = easting[start], northing[start]
+	abx, aby = easting[end] - ax, northing[end] - ay
+	px, py = easting[start + 1:end] - ax, northing[start + 1:end] - ay
+
+	seg_len2 = abx**2 + aby**2
+
+	if seg_len2 == 0:
+		return np.hypot(px, py)
+
+	u = np.clip((px * abx + py * aby) / seg_len2, 0.0, 1.0)
+
+	return np.hypot(px - u * abx, py - u * aby)
+
+
+
+def simplify_indices(easting, northing, tolerance):
+	"""
+	Sorted array of the indices of the points Douglas-Peucker keeps (see
+	module docstring) for a tolerance in meters.
+	"""
+	easting = np.asarray(easting, dtype=np.float64)
+	northing = np.asarray(northing, dtype=np.float64)
+	num_points = len(easting)
+
+	if num_points < 3:
+		return np.arange(num_points)
+
+	keep = np.zeros(num_points, dtype=bool)
+	keep[0] = keep[-1] = True
+
+	stack = [(0, num_points - 1)]  # stretches still to check (no recursion, long courses would hit the limit)
+
+	while stack:
+		start, end = stack.pop()
+		if end - start < 2:
+			continue
+
+		dists = segment_distances(easting, northing, start, end)
+		i = int(np.argmax(dists))
+
+		if dists[i] > tolerance:
+			split = start + 1 + i
+			keep[split] = True
+			stack.append((start, split))
+			stack.append((split, end))
+
+	return np.flatnonzero(keep)
+
+
+
+def simplify_points(points, tolerance):
+	"""
+	Simplified copy of a list/array of [easting, northing] pairs, as a list.
+	"""
+	points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+	return points[simplify_indices(points[:,0], points[:,1], tolerance)].tolist()
+
+
+
+def simplify_latlon_indices(lats, lons, tolerance):
+	"""
+	simplify_indices for lat/lons, which are projected to UTM (the first
+	point's zone) so the tolerance is in meters.
+	"""
+	if len(lats) == 0:
+		return np.arange(0)
+
+	utm_projection = projection.UTMProjection.from_latlon(lats[0], lons[0])
+	easting, northing = utm_projection.to_utm_batch(lats, lons)
+
+	return simplify_indices(easting, northing, tolerance)
+
+
+
+def simplify_flags(flags, tolerance):
+	"""
+	Keeps the flags/goals (with 'decPos' lat/lons) that simplify_latlon_indices
+	keeps. Prints how many were removed.
+	"""
+	lats = [flag['decPos']['lat'] for flag in flags]
+	lons = [flag['decPos']['lon'] for flag in flags]
+
+	indices = simplify_latlon_indices(lats, lons, tolerance)
+
+	print("Simplified {} points to {} ({}m tolerance)..".format(len(flags), len(indices), tolerance))
+
+	return [flags[i] for i in indices]
+
+
+
+def collapse_stationary_indices(easting, northing, distance=0.1, duration=2.0, times=None, rate=DEFAULT_RATE):
+	"""
+	Sorted array of the indices of the points kept after collapsing
+	stationary runs (see module docstring): a run of points within distance
+	(meters) of its first point that lasts at least duration (seconds) is
+	replaced by its first point. times are the points' times in seconds,
+	or the points are taken to be rate Hz apart.
+	"""
+	easting = np.asarray(easting, dtype=np.float64)
+	northing = np.asarray(northing, dtype=np.float64)
+	num_points = len(easting)
+
+	if times is None:
+		times = np.arange(num_points) / float(rate)
+	times = np.asarray(times, dtype=np.float64)
+
+	keep = np.ones(num_points, dtype=bool)
+	i = 0
+
+	while i < num_points - 1:
+
+		# end of the run of points within distance of point i, checked a window at a time:
+		end = i + 1
+		window = 16
+		while end < num_points:
+			dists = np.hypot(easting[end:end + window] - easting[i], northing[end:end + window] - northing[i])
+			outside = np.flatnonzero(dists > distance)
+			if len(outside) > 0:
+				end += int(outside[0])
+				break
+			end += len(dists)
+			window *= 2
+
+		if end - i > 1 and times[end - 1] - times[i] >= duration:
+			keep[i + 1:end] = False
+			i = end
+		else:
+			i += 1
+
+	return np.flatnonzero(keep)
+
+
+
+def collapse_stationary_flags(flags, distance=0.1, duration=2.0, rate=DEFAULT_RATE):
+	"""
+	Collapses stationary runs of flags/goals (see collapse_stationary_indices),
+	using their 'utmPos' if they have it, otherwise their 'decPos'. Times come
+	from their 'time' values (e.g., '2018/07/02 17:26:39.000' from LLH
+	courses) if they all have one, otherwise from their 'index' (the GPS
+	sample number in courses built from bags and CSVs, so courses built with
+	an n_skip still get the right times). Returns (kept flags, number of
+	flags removed).
+	"""
+	if not flags:
+		return flags, 0
+
+	if all(flag.get('utmPos', {}).get('easting') is not None for flag in flags):
+		easting = [flag['utmPos']['easting'] for flag in flags]
+		northing = [flag['utmPos']['northing'] for flag in flags]
+	else:
+		lats = [flag['decPos']['lat'] for flag in flags]
+		lons = [flag['decPos']['lon'] for flag in flags]
+		easting, northing = projection.UTMProjection.from_latlon(lats[0], lons[0]).to_utm_batch(lats, lons)
+
+	times = None
+	if all(flag.get('time') for flag in flags):
+		times = np.array([flag['time'].replace('/', '-').replace(' ', 'T') for flag in flags], dtype='datetime64[ms]')
+		times = (times - times[0]).astype(np.float64) / 1000.0
+	elif all(flag.get('index') is not None for flag in flags):
+		times = np.array([float(flag['index']) for flag in flags]) / float(rate)
+
+	indices = collapse_stationary_indices(easting, northing, distance, duration, times, rate)
+
+	return [flags[i] for i in indices], len(flags) - len(indices)
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+"""
+Python module for reading a course JSON file's flags/goals one at a time,
+without loading the whole file.
+
+The file is read in chunks, and each entry of the 'flags' (or 'goals')
+list is decoded on its own with json's raw_decode, so memory use depends
+on the chunk size rather than the size of the course. Only the top level
+flags/goals list of single course files (see courses/ and
+NavCourse.from_course) is read; multirow course files ({'rows': [..]})
+raise an Exception rather than giving just one of their rows.
+"""
+
+import json
+
+
+
+def iter_course_entries(source, chunk_size=65536):
+	"""
+	Yields the flag/goal objects of a course JSON file one at a time.
+	source is a filename or a file object.
+	"""
+	if hasattr(source, 'read'):
+		for entry in _iter_entries(source, chunk_size):
+			yield entry
+		return
+
+	with open(source, 'r') as filein:
+		for entry in _iter_entries(filein, chunk_size):
+			yield entry
+
+
+
+class _ChunkReader(object):
+	"""
+	Reads a JSON file a chunk at a time, decoding one value at a time
+	from its current position.
+	"""
+	def __init__(self, filein, chunk_size):
+		self.filein = filein
+		self.chunk_size = chunk_size
+		self.decoder = json.JSONDecoder()
+		self.buf = ''
+		self.pos = 0
+		self.eof = False
+
+	def fill(self):
+		"""
+		Reads another chunk, dropping the part of the buffer that's been
+		used. Returns False at the end of the file.
+		"""
+		if self.eof:
+			return False
+		chunk = self.filein.read(self.chunk_size)
+		self.eof = not chunk
+		self.buf = self.buf[self.pos:] + chunk
+		self.pos = 0
+		return not self.eof
+
+	def next_char(self, skip=' \t\r\n'):
+		"""
+		Skips past any skip characters and returns the next character
+		(without using it up), or '' at the end of the file.
+		"""
+		while True:
+			while self.pos < len(self.buf) and self.buf[self.pos] in skip:
+				self.pos += 1
+			if self.pos < len(self.buf):
+				return self.buf[self.pos]
+			if not self.fill():
+				return ''
+
+	def decode(self):
+		"""
+		Decodes the JSON value at the current position, reading more chunks
+		if it's split between them.
+		"""
+		while True:
+			try:
+				value, end = self.decoder.raw_decode(self.buf, self.pos)
+			except ValueError:
+				if self.fill():
+					continue
+				raise Exception("Course file ended in the middle of a value, course_stream module..")
+			if end == len(self.buf) and self.fill():
+				continue  # e.g., a number that may go on in the next chunk
+			self.pos = end
+			return value
+
+
+
+def _iter_entries(filein, chunk_size):
+	"""
+	Finds the flags/goals key among the top level keys of the course
+	object (skipping the other top level values), then decodes the list's
+	entries one at a time.
+	"""
+	reader = _ChunkReader(filein, chunk_size)
+
+	if reader.next_char() != '{':
+		raise Exception("Course file isn't a JSON object, course_stream module..")
+	reader.pos += 1
+
+	while True:
+		char = reader.next_char(' \t\r\n,')
+		if char in ('}', ''):
+			raise Exception("Could not find flags or goals in course file, course_stream module..")
+
+		key = reader.decode()
+
+		if reader.next_char() != ':':
+			raise Exception("Expected ':' after key {} in course file, course_stream module..".format(key))
+		reader.pos += 1
+
+		if key in ('flags', 'goals'):
+			break
+
+		if key == 'rows':
+			raise Exception("Multirow course files can't be streamed (load them with NavCourse.from_course), course_stream module..")
+
+		reader.next_char()
+		reader.decode()  # skips this key's value
+
+	if reader.next_char() != '[':
+		raise Exception("Course file's flags/goals aren't a list, course_stream module..")
+	reader.pos += 1
+
+	while True:
+		char = reader.next_char(' \t\r\n,')
+		if char == ']':
+			return
+		if char == '':
+			raise Exception("Course file ended in the middle of its flags/goals, course_stream module..")
+		yield reader.decode()
+
+
+
+def iter_course_points(source, units='utm', n_skip=1, drop_last=True, chunk_size=65536):
+	"""
+	Yields (easting, northing) ('utm' units) or (lat, lon) ('dec' units)
+	tuples from a course JSON file, every n_skip-th entry. Like the
+	range(0, len(flags) - 1, n_skip) loops this replaces, the last entry is
+	left out unless drop_last is False.
+	"""
+	if units == 'utm':
+		pos_key, keys = 'utmPos', ('easting', 'northing')
+	elif units == 'dec':
+		pos_key, keys = 'decPos', ('lat', 'lon')
+	else:
+		raise Exception("Units must be 'utm' or 'dec', course_stream module..")
+
+	pending = None  # previous entry, yielded once it's known not to be the last one
+	i = 0
+
+	for entry in iter_course_entries(source, chunk_size):
+		if pending is not None and (i - 1) % n_skip == 0:
+			pos = pending[pos_key]
+			yield (float(pos[keys[0]]), float(pos[keys[1]]))
+		pending = entry
+		i += 1
+
+	if pending is not None and not drop_last and (i - 1) % n_skip == 0:
+		pos = pending[pos_key]
+		yield (float(pos[keys[0]]), float(pos[keys[1]]))
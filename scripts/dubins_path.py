@@ -6,6 +6,7 @@ import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import orientation_transforms as ot  # local requirement
+from nav_course import NavCourse  # local requirement
 
 
 
@@ -98,33 +99,63 @@ def plot_handler(configurations, exit_row, entry_row, q0, q1, show=True):
 
 
 
-def handle_dubins(course_data, exit_row_index, entry_row_index, angle_tolerance=0.523599):
+def get_course_rows(course, exit_row_index, entry_row_index):
+	"""
+	Exit and entry rows ([[easting, northing], ..] arrays) and their
+	angles from a multirow NavCourse, using its precomputed row angles.
+	"""
+	exit_row, entry_row = [], []
+	exit_row_angle, entry_row_angle = None, None
+
+	for i, (row_name, row) in enumerate(course.rows()):
+
+		if int(row_name) == int(exit_row_index):
+			exit_row = np.column_stack((row.easting, row.northing))
+			exit_row_angle = float(course.row_angles[i])
+
+		elif int(row_name) == int(entry_row_index):
+			entry_row = np.column_stack((row.easting, row.northing))
+			entry_row_angle = float(course.row_angles[i])
+
+	return exit_row, entry_row, exit_row_angle, entry_row_angle
 
+
+
+def handle_dubins(course_data, exit_row_index, entry_row_index, angle_tolerance=0.523599, plot=True):
+	"""
+	Dubins path from the end of the exit row to the entry row. course_data
+	is a multirow course JSON object, or a multirow NavCourse (then the row
+	angles aren't recomputed for every turn).
+	"""
 	# exit_row_index = int(sys.argv[2])  # row the rover is exiting
 	# entry_row_index = int(sys.argv[3])  # row it's about to go down
 
 	exit_row, entry_row = [], []
 
-	print("incoming course data: {}".format(course_data))
 	print("exit_row_index: {}".format(exit_row_index))
 	print("exit_row_index type: {}".format(type(exit_row_index)))
 
-	# gets start and end rows arrays:
-	for row_obj in course_data['rows']:
+	if isinstance(course_data, NavCourse):
+		exit_row, entry_row, exit_row_angle, entry_row_angle = get_course_rows(course_data, exit_row_index, entry_row_index)
 
-		if int(row_obj['index']) == int(exit_row_index):
-			exit_row = row_obj['row']
+	else:
+		print("incoming course data: {}".format(course_data))
 
-		elif int(row_obj['index']) == int(entry_row_index):
-			entry_row = row_obj['row']
+		# gets start and end rows arrays:
+		for row_obj in course_data['rows']:
 
-	print("exit and entry rows: {}; {}".format(exit_row, entry_row))
+			if int(row_obj['index']) == int(exit_row_index):
+				exit_row = row_obj['row']
+
+			elif int(row_obj['index']) == int(entry_row_index):
+				entry_row = row_obj['row']
 
+		# pick end point for start row, first point end row:
 
-	# pick end point for start row, first point end row:
+		exit_row_angle = get_row_angle(exit_row)
+		entry_row_angle = get_row_angle(entry_row)
 
-	exit_row_angle = get_row_angle(exit_row)
-	entry_row_angle = get_row_angle(entry_row)
+	print("exit and entry rows: {}; {}".format(exit_row, entry_row))
 
 	print("exit row angle: {}".format(math.degrees(exit_row_angle)))
 	print("entry row angle: {}".format(math.degrees(entry_row_angle)))
@@ -148,7 +179,8 @@ def handle_dubins(course_data, exit_row_index, entry_row_index, angle_tolerance=
 	path = dubins.shortest_path(q0, q1, turning_radius)
 	configurations, _ = path.sample_many(step_size)
 
-	plot_handler(configurations, exit_row, entry_row, q0, q1)
+	if plot:
+		plot_handler(configurations, exit_row, entry_row, q0, q1)
 
 	dubins_course = np.array(configurations)
 
@@ -20,6 +20,7 @@ import json
 from std_msgs.msg import Bool, String, Int64
 from sensor_msgs.msg import NavSatFix
 import nav_tracks  # local requirement
+import projection  # local requirement
 
 
 
@@ -42,6 +43,7 @@ class FlagHandler:
 		self.flag_index_publisher = rospy.Publisher('/flag_index', Int64, queue_size=1)
 
 		self.flag_tolerance = 0.2  # distance to flag to consider being at said flag (units: meters)
+		self.projection = None  # lat/lon -> utm projection, set up on first /fix (see projection module)
 		self.flag_index = 0  # Index of the robot's current flag it's going toward
 		self.flag_run_complete = False
 
@@ -110,8 +112,11 @@ class FlagHandler:
 	def get_utm_from_fix(self, current_fix):
 		"""
 		Converts fix object with 'latitude' and 'longitude' to utm
+		(easting, northing).
 		"""
-		return utm.from_latlon(current_fix.latitude, current_fix.longitude)
+		if self.projection is None:
+			self.projection = projection.UTMProjection.from_latlon(current_fix.latitude, current_fix.longitude)
+		return self.projection.to_utm(current_fix.latitude, current_fix.longitude)
 
 
 
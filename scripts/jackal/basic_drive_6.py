@@ -27,6 +27,7 @@ import numpy as np
 from nav_tracks import NavTracks
 from jackal_nav_controller import NavController
 import orientation_transforms
+import target_tracker
 
 
 
@@ -236,22 +237,15 @@ class SingleGoalNav():
 		"""
 		From red_rover_model pure_puruit module. Loops through course
 		points (x and y) and builds a list of the diff b/w robot's position and
-		each x and y in the course. Finally, 
+		each x and y in the course (starting at current goal, onward). Returns
+		the index, relative to current_goal_index, of the first point that's
+		further than the look-ahead.
 		"""
-		dx = [current_position[0] - icx for icx in cx[current_goal_index:]]  # diff b/w robot's position and all x values in course (starting at current goal, onward)
-		dy = [current_position[1] - icy for icy in cy[current_goal_index:]]  # diff b/w robot's position and all y values in course (starting at current goal, onward)
-
-		d = [abs(math.sqrt(idx ** 2 + idy ** 2)) for (idx, idy) in zip(dx, dy)]  # scalar diff b/w robot and course values
+		d = target_tracker.calc_distances(current_position, cx[current_goal_index:], cy[current_goal_index:])
 
 		print("Determining goal point based on look-ahead of {}".format(self.look_ahead))
 
-		ind = 0
-		for pos_diff in d:
-			# print("Distance between Jackal and goal: index={}, value=({}, {}), distance={} meters".format(ind, cx[ind], cy[ind], d[ind]))
-			print("Distance between Jackal and goal: index={}, value=({}, {}), distance={} meters".format(ind, cx[ind], cy[ind], pos_diff))
-			if pos_diff > self.look_ahead:
-				return d.index(pos_diff)  # return index of goal to go to
-			ind += 1
+		return target_tracker.first_index_beyond(d, self.look_ahead)
 
 
 
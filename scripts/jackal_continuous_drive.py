@@ -17,9 +17,14 @@ from sensor_msgs.msg import Imu
 from geometry_msgs.msg import Quaternion
 
 # Local package requirements:
-from nav_tracks import NavTracks
 from nav_nudge import NavNudge
 import orientation_transforms
+import target_tracker
+import pure_pursuit
+from pose_trigger import PoseTrigger
+import projection
+from nav_course import NavCourse
+import course_cache
 
 
 
@@ -30,7 +35,7 @@ class SingleGoalNav(object):
 	and its orientatiion. Subscribes to GPS and IMU topics.
 	"""
 
-	def __init__(self, path_json, nudge_factor=None):
+	def __init__(self, path_json, nudge_factor=None, steering_mode='incremental'):
 		
 		# Give the node a name
 		rospy.init_node('single_goal_nav')
@@ -50,6 +55,12 @@ class SingleGoalNav(object):
 		self.linear_speed = 0.3  # jackal's linear speed
 		self.angular_speed = 0.1  # jackal's angular speed
 
+		# Steering: 'incremental' (turns up to angle_trim w/ IMU, blocking) or 'pure_pursuit' (new Twist every step):
+		self.steering_mode = steering_mode
+		self.max_angular_speed = 0.5  # jackal's max angular speed for pure pursuit
+		self.max_lateral_accel = None  # m/s^2, slows pure pursuit down in the course's curves if set (e.g., 0.2)
+		self.min_linear_speed = 0.1  # slowest speed in curves
+
 		# Set rospy to exectute a shutdown function when terminating the script
 		rospy.on_shutdown(self.shutdown)
 
@@ -59,11 +70,15 @@ class SingleGoalNav(object):
 		# Set the equivalent ROS rate variable
 		self.r = rospy.Rate(self.rate)
 
+		# Runs a control step when a new pose (/fix or IMU) arrives, up to max_control_rate steps/s:
+		self.max_control_rate = 10
+		self.pose_trigger = PoseTrigger(self.max_control_rate, rospy.get_time)
+
 		self.path_json = path_json  # The path/course the red rover will follow!
 
 		if nudge_factor and isinstance(nudge_factor, float):
 			print("Using nudge factor of {} to shift the course!".format(nudge_factor))
-			nn = NavNudge(json.dumps(path_json), nudge_factor, 0.2)  # NOTE: HARD-CODED SPACING FACTOR TO 0.2M FOR NOW
+			nn = NavNudge(path_json if isinstance(path_json, NavCourse) else json.dumps(path_json), nudge_factor, 0.2)  # NOTE: HARD-CODED SPACING FACTOR TO 0.2M FOR NOW
 			self.path_json = nn.nudged_course
 
 
@@ -71,6 +86,9 @@ class SingleGoalNav(object):
 
 		self.look_ahead = 1.5  # look-ahead for target index, in meters
 
+		self.tracker = target_tracker.TargetTracker(self.look_ahead)  # tracks target index from one fix to the next
+		self.tracker.use_arc_length = getattr(self.path_json, 'spacing', None) is not None  # binary search look-ahead on resampled courses
+
 		self.angle_tolerance = 0.1  # angle tolerance in degrees
 
 		self.angle_trim = 2.0  # max angle inc per iteration (in degrees)
@@ -79,9 +97,12 @@ class SingleGoalNav(object):
 		
 		self.current_goal = None  # [easting, northing] array
 		self.current_pos = None  # [easting, northing] array
+
+		self.projection = None  # lat/lon -> utm projection, set up on first /fix (see projection module)
+		self.use_local_projection = False  # approximates utm around the first fix instead of full utm conversions
 		self.current_angle = None  # angle from imu in radians
 
-		self.np_course = None  # lazy np array version of course for certain manipulations
+		self.course = None  # NavCourse being followed (see nav_course module)
 
 		self.at_flag = False
 		self.flag_index = None
@@ -142,18 +163,19 @@ class SingleGoalNav(object):
 				print("Waiting for drive node to be started..")
 				return
 
-			if not isinstance(self.path_json, list):
-				nt = NavTracks()
-				path_array = nt.get_track_from_course(self.path_json)  # builds list of [easting, northing] pairs from course file
+			if isinstance(self.path_json, NavCourse):
+				course = self.path_json
+			elif not isinstance(self.path_json, list):
+				course = NavCourse.from_course(self.path_json)  # builds arrays of eastings, northings from course file
 			else:
-				path_array = self.path_json  # assuming it's already a list of [easting, northing] pairs..
+				course = NavCourse.from_points(self.path_json)  # assuming it's already a list of [easting, northing] pairs..
 
-			print("The Course: {}".format(path_array))
+			print("The Course: {} points".format(len(course)))
 			print("Starting path following routine..")
 
 			self.target_index = 0
 
-			self.start_path_following(path_array, self.target_index)
+			self.start_path_following(course, self.target_index)
 
 
 
@@ -169,8 +191,13 @@ class SingleGoalNav(object):
 
 		"""		
 		_lat, _lon = msg.latitude, msg.longitude
-		curr_pose_utm = utm.from_latlon(_lat, _lon)
+
+		if self.projection is None:
+			self.projection = projection.make_projection(_lat, _lon, self.use_local_projection)
+
+		curr_pose_utm = self.projection.to_utm(_lat, _lon)
 		self.current_pos = [curr_pose_utm[0], curr_pose_utm[1]]
+		self.pose_trigger.notify(msg.header.stamp.to_sec())  # wakes up drive loop
 
 
 
@@ -178,7 +205,7 @@ class SingleGoalNav(object):
 		"""
 		Angle from IMU in radians.
 		"""
-		self.current_angle = self.quat_to_angle(msg.orientation)
+		self.current_angle = self.quat_to_angle(msg.orientation)  # only /fix wakes up the drive loop
 
 
 
@@ -216,13 +243,13 @@ class SingleGoalNav(object):
 
 
 
-	def start_path_following(self, path_array, init_target):
+	def start_path_following(self, course, init_target):
 
-		if not isinstance(path_array, list):
+		if not isinstance(course, NavCourse):
 			self.shutdown()
-			raise Exception("Path must be a list of [easting, northing] pairs..")
+			raise Exception("Path must be a NavCourse of [easting, northing] points..")
 
-		if len(path_array) < 1:
+		if len(course) < 1:
 			self.shutdown()
 			raise Exception("Path must be at least one point..")
 
@@ -238,16 +265,18 @@ class SingleGoalNav(object):
 
 		print("INITIAL TARGET: {}".format(init_target))
 
-		self.np_course = np.array(path_array)  # sets numpy array of course\
+		self.course = course  # sets course to follow
 
 		rospy.sleep(2)  # give messages time to publish
 
 		_curr_utm = self.current_pos  # gets current /fix
-		self.target_index = self.calc_target_index(_curr_utm, init_target, self.np_course[:,0], self.np_course[:,1])  # try using int_target
-		self.current_goal = path_array[self.target_index]  # sets current goal
+		self.target_index = self.calc_target_index(_curr_utm, init_target, self.course.easting, self.course.northing)  # try using int_target
+		self.current_goal = self.course.point(self.target_index)  # sets current goal
+		self.tracker.look_ahead = self.look_ahead
+		self.tracker.reset()  # first fix in the drive loop searches the whole course
 
 
-		print("Total length of path array: {}".format(len(path_array)))
+		print("Total length of path array: {}".format(len(self.course)))
 		print("Initial target index: {}".format(self.target_index))
 		print("Initial target UTM: {}".format(self.current_goal))
 
@@ -280,10 +309,13 @@ class SingleGoalNav(object):
 				print("Lost GPS fix.. Stopping the rover until fix is obtained..")
 				self.wait_for_fix()
 
-			rospy.sleep(0.2)
+			pose_stamp = self.pose_trigger.wait()  # waits for a new pose instead of a fixed sleep
+
+			if pose_stamp is None:
+				continue  # no new pose yet, check for flags, lost fix, etc. again
 
 			_curr_utm = self.current_pos  # gets current utm
-			self.target_index = self.calc_target_index(_curr_utm, self.target_index, self.np_course[:,0], self.np_course[:,1])
+			self.target_index = self.tracker.update(_curr_utm, self.course.easting, self.course.northing, self.course)
 
 			print("target index: {}".format(self.target_index))
 
@@ -292,9 +324,13 @@ class SingleGoalNav(object):
 				self.shutdown()
 				return
 
-			self.current_goal = self.np_course.tolist()[self.target_index]
+			self.current_goal = self.course.point(self.target_index)
 			_curr_angle = self.current_angle  # gets current angle in radians
 
+			if self.steering_mode == 'pure_pursuit':
+				self.pure_pursuit_step(_curr_utm, _curr_angle, pose_stamp)
+				continue
+
 			A = (_curr_utm[0], _curr_utm[1], _curr_angle)
 			B = (self.current_goal[0], self.current_goal[1], 0)  # note: B angle not used..
 
@@ -312,7 +348,7 @@ class SingleGoalNav(object):
 
 				print("Telling Rover to turn {} degreess..".format(turn_angle))
 
-				self.translate_angle_with_imu(turn_angle)
+				self.translate_angle_with_imu(turn_angle, pose_stamp)
 
 				print("Finished turn.")
 
@@ -325,31 +361,12 @@ class SingleGoalNav(object):
 
 	def calc_target_index(self, current_position, current_goal_index, cx, cy):
 		"""
-		From red_rover_model pure_puruit module. Loops through course
-		points (x and y) and builds a list of the diff b/w robot's position and
-		each x and y in t{he course. Finally, 
+		Finds the closest course point to the robot, then the first point
+		past it that's further than the look-ahead (see target_tracker module).
+		Returns None at the end of the course.
 		"""
-		# note: numpy seems to return blank array if out of index, so
-		# it should return None at end of course.
-
-		dx = [current_position[0] - icx for icx in cx]  # diff b/w robot's position and all x values in course (starting at current goal, onward)
-		dy = [current_position[1] - icy for icy in cy]  # diff b/w robot's position and all y values in course (starting at current goal, onward)
-
-		d = [math.sqrt(idx ** 2 + idy ** 2) for (idx, idy) in zip(dx, dy)]  # scalar diff b/w robot and course values
-
 		print("Determining goal point based on look-ahead of {}".format(self.look_ahead))
-
-		ind = d.index(min(d))  # index of closest goal to robot
-
-		print("Min index: {}".format(ind))
-
-		# loops list, starting at closest point to robot:
-		for _diff in d[ind:]:
-			if _diff > self.look_ahead:
-				return ind				
-			ind += 1
-
-		return None
+		return target_tracker.calc_target_index(current_position, cx, cy, self.look_ahead)
 
 
 
@@ -397,10 +414,11 @@ class SingleGoalNav(object):
 		########################################################################
 
 		_curr_utm = self.current_pos
-		self.target_index = self.calc_target_index(_curr_utm, self.target_index, self.np_course[:,0], self.np_course[:,1])
+		self.target_index = self.calc_target_index(_curr_utm, self.target_index, self.course.easting, self.course.northing)
 
-		updated_path =self.np_course.tolist()[self.target_index:]  # set remaining path to follow
-		self.np_course = np.array(updated_path)  # updates np array of course
+		if self.target_index is not None:
+			self.course = self.course.remaining(self.target_index)  # set remaining path to follow (a view, no copying)
+		self.tracker.reset(0)  # robot is at the start of the remaining path
 
 		self.at_flag = False  # set at_flag to False after sample is collected..
 
@@ -408,11 +426,36 @@ class SingleGoalNav(object):
 
 
 
-	def translate_angle_with_imu(self, goal_angle):
+	def pure_pursuit_step(self, current_position, current_angle, pose_stamp=None):
+		"""
+		Drives the Jackal along the arc that goes through the current goal
+		(see pure_pursuit module). Publishes a Twist every control step instead
+		of waiting for a turn to finish.
+		"""
+		curvature = pure_pursuit.calc_curvature(current_position, current_angle, self.current_goal)
+
+		print("Pure pursuit curvature: {}".format(curvature))
+
+		linear_speed = self.linear_speed
+		if self.max_lateral_accel:
+			path_curvature = self.course.curvature[self.target_index]  # precomputed with the course
+			linear_speed = pure_pursuit.calc_scheduled_speed(path_curvature, self.linear_speed, self.min_linear_speed, self.max_lateral_accel)
+
+		move_cmd = Twist()
+		move_cmd.linear.x = linear_speed
+		move_cmd.angular.z = pure_pursuit.calc_angular_velocity(curvature, linear_speed, self.max_angular_speed)
+
+		self.cmd_vel.publish(move_cmd)
+		self.pose_trigger.report_latency(pose_stamp)
+
+
+
+	def translate_angle_with_imu(self, goal_angle, pose_stamp=None):
 		"""
 		Uses IMU to translate a number of degrees (goal_angle), but stops
 		if it exceeds the turning boundaries of the red rover, which uses
-		the pivot data to determine.
+		the pivot data to determine. pose_stamp is the timestamp of the pose
+		the turn was computed from, for latency reporting.
 		"""
 
 		# Below move_cmd sequence is an attempt to go forward and turn at the same time with the jackal!!!
@@ -433,6 +476,9 @@ class SingleGoalNav(object):
 
 			self.cmd_vel.publish(move_cmd)
 
+			self.pose_trigger.report_latency(pose_stamp)
+			pose_stamp = None  # only the first command counts toward latency
+
 			rospy.sleep(1.0/self.rate)
 
 			curr_angle = self.current_angle
@@ -488,13 +534,25 @@ if __name__ == '__main__':
 		print("No nudge factor provided, assuming 0..")
 		nudge_factor = None
 
-	coursefile = open(course_filename, 'r')
-	course = json.loads(coursefile.read())
+	try:
+		steering_mode = sys.argv[3]  # 'incremental' or 'pure_pursuit'
+	except IndexError:
+		steering_mode = 'incremental'
+
+	try:
+		spacing = float(sys.argv[4])  # resamples the course to points this many meters apart (e.g., 0.1)
+	except IndexError:
+		spacing = None
+
+	if nudge_factor:
+		print("Using nudge factor of {} to shift the course!".format(nudge_factor))
+
+	course = course_cache.load_course(course_filename, nudge_factor, spacing=spacing)  # JSON or binary (.navc) course file, nudged, resampled and cached
 
 	print("Course to follow: {}".format(course_filename))
 
 	try:
-		SingleGoalNav(course, nudge_factor)
+		SingleGoalNav(course, None, steering_mode)  # course is already nudged
 	except rospy.ROSInterruptException:
 		rospy.loginfo("Navigation terminated.")
 		rospy.loginfo("Shutting down drive node!")
@@ -27,6 +27,10 @@ import dubins
 from nav_tracks import NavTracks
 from nav_nudge import NavNudge
 import orientation_transforms
+import target_tracker
+from pose_trigger import PoseTrigger
+import projection
+from nav_course import NavCourse
 import dubins_path as dp
 
 
@@ -74,6 +78,10 @@ class SingleGoalNav(object):
 		# Set the equivalent ROS rate variable
 		self.r = rospy.Rate(self.rate)
 
+		# Runs a control step when a new pose (/fix or IMU) arrives, up to max_control_rate steps/s:
+		self.max_control_rate = 10
+		self.pose_trigger = PoseTrigger(self.max_control_rate, rospy.get_time)
+
 		self.path_json = path_json  # The path/course the red rover will follow!
 
 		if nudge_factor and isinstance(nudge_factor, float):
@@ -88,6 +96,8 @@ class SingleGoalNav(object):
 		self.look_ahead_row = 1.5
 		self.look_ahead_curve = 0.5
 
+		self.tracker = target_tracker.TargetTracker(self.look_ahead)  # tracks target index from one fix to the next
+
 		self.angle_tolerance = 0.1  # angle tolerance in degrees
 
 		self.angle_trim = 2.0  # max angle inc per iteration (in degrees)
@@ -98,9 +108,12 @@ class SingleGoalNav(object):
 		
 		self.current_goal = None  # [easting, northing] array
 		self.current_pos = None  # [easting, northing] array
+
+		self.projection = None  # lat/lon -> utm projection, set up on first /fix (see projection module)
+		self.use_local_projection = False  # approximates utm around the first fix instead of full utm conversions
 		self.current_angle = None  # angle from imu in radians
 
-		self.np_course = None  # lazy np array version of course for certain manipulations
+		self.course = None  # NavCourse being followed (see nav_course module)
 
 		self.at_flag = False
 		self.flag_index = None
@@ -207,8 +220,13 @@ class SingleGoalNav(object):
 
 		"""		
 		_lat, _lon = msg.latitude, msg.longitude
-		curr_pose_utm = utm.from_latlon(_lat, _lon)
+
+		if self.projection is None:
+			self.projection = projection.make_projection(_lat, _lon, self.use_local_projection)
+
+		curr_pose_utm = self.projection.to_utm(_lat, _lon)
 		self.current_pos = [curr_pose_utm[0], curr_pose_utm[1]]
+		self.pose_trigger.notify(msg.header.stamp.to_sec())  # wakes up drive loop
 
 
 
@@ -216,7 +234,7 @@ class SingleGoalNav(object):
 		"""
 		Angle from IMU in radians.
 		"""
-		self.current_angle = self.quat_to_angle(msg.orientation)
+		self.current_angle = self.quat_to_angle(msg.orientation)  # only /fix wakes up the drive loop
 
 
 
@@ -273,6 +291,8 @@ class SingleGoalNav(object):
 		if self.stop_gps:
 			self.wait_for_fix()
 
+		multirow_course = NavCourse.from_course({'rows': path_array}).precompute()  # row angles etc. computed once for the dubins turns
+		rows = multirow_course.rows()  # [(row index, row course), ..], views of one set of arrays
 
 		# pick first row in multirow array to start following:
 		# for row_obj in path_array:
@@ -280,23 +300,20 @@ class SingleGoalNav(object):
 
 			# loop through row objects and start following down first row..
 
-			row_array = path_array[i]['row']  # row array
-			row_index = path_array[i]['index']  # row index
-
-			self.np_course = np.array(row_array)
+			row_index, row_course = rows[i]  # row index and row course
 
 			_curr_utm = self.current_pos  # gets current utm
-			init_target = self.calc_target_index(_curr_utm, 0, self.np_course[:,0], self.np_course[:,1])
+			init_target = self.calc_target_index(_curr_utm, 0, row_course.easting, row_course.northing)
 
 			self.angle_trim = self.angle_trim_row  # set angle trim to follow row (mostly straight)
 			self.look_ahead = self.look_ahead_row
 			self.angular_speed = self.angular_speed_row
 			self.linear_speed = self.linear_speed_row
-			self.execute_row_follow(row_array, init_target)  # follow down row
+			self.execute_row_follow(row_course, init_target)  # follow down row
 
 			# when row is finished, run dubins to get to next row!
 
-			dubins_path = dp.handle_dubins(self.path_json, row_index, path_array[i+1]['index'])  # run dubins from current end or row to next row
+			dubins_path = dp.handle_dubins(multirow_course, row_index, path_array[i+1]['index'])  # run dubins from current end or row to next row
 
 			print("dubins path: {}".format(dubins_path))
 
@@ -310,42 +327,41 @@ class SingleGoalNav(object):
 			self.angular_speed = self.angular_speed_curve
 			self.linear_speed = self.linear_speed_curve
 			print("setting angle trim to {}, look ahead to {}".format(self.angle_trim, self.look_ahead))
-			self.execute_row_follow(dubins_path.tolist(), init_target)  # like execute_row_follow, but with more sensitive parameters
+			self.execute_row_follow(NavCourse.from_points(dubins_path[:,0:2]), init_target)  # like execute_row_follow, but with more sensitive parameters
 
 			print("finished dubins curve, following next row!")
 
 		# run last row after above loop is finished!
-		row_array = path_array[len(path_array) - 1]['row']  # row array
-		row_index = path_array[len(path_array) - 1]['index']  # row index
+		row_index, row_course = rows[len(rows) - 1]  # row index and row course
 
 		print("Following last row! Row {}".format(row_index))
 
-		self.np_course = np.array(row_array)
-
 		_curr_utm = self.current_pos  # gets current utm
-		init_target = self.calc_target_index(_curr_utm, 0, self.np_course[:,0], self.np_course[:,1])
+		init_target = self.calc_target_index(_curr_utm, 0, row_course.easting, row_course.northing)
 
 		self.angle_trim = self.angle_trim_row  # set angle trim to follow row (mostly straight)
 		self.look_ahead = self.look_ahead_row
 		self.angular_speed = self.angular_speed_row
 		self.linear_speed = self.linear_speed_row
-		self.execute_row_follow(row_array, init_target)  # follow down row
+		self.execute_row_follow(row_course, init_target)  # follow down row
 
 
 
-	def execute_row_follow(self, path_array, init_target):
+	def execute_row_follow(self, course, init_target):
 
 		print("INITIAL TARGET: {}".format(init_target))
 
-		self.np_course = np.array(path_array)  # sets numpy array of course\
+		self.course = course  # sets course (row or curve) to follow
 
 		rospy.sleep(2)  # give messages time to publish
 
 		_curr_utm = self.current_pos  # gets current /fix
-		self.target_index = self.calc_target_index(_curr_utm, init_target, self.np_course[:,0], self.np_course[:,1])  # try using int_target
-		self.current_goal = path_array[self.target_index]  # sets current goal
+		self.target_index = self.calc_target_index(_curr_utm, init_target, self.course.easting, self.course.northing)  # try using int_target
+		self.current_goal = self.course.point(self.target_index)  # sets current goal
+		self.tracker.look_ahead = self.look_ahead
+		self.tracker.reset()  # first fix in the drive loop searches the whole course
 
-		print("Total length of path array: {}".format(len(path_array)))
+		print("Total length of path array: {}".format(len(self.course)))
 		print("Initial target index: {}".format(self.target_index))
 		print("Initial target UTM: {}".format(self.current_goal))
 
@@ -365,8 +381,6 @@ class SingleGoalNav(object):
 		###################################################################
 		while not rospy.is_shutdown():
 
-			rospy.sleep(0.2)
-
 			if self.at_flag:
 				print("At a flag in the course! Stopping the rover to take a sample.")
 				self.execute_flag_routine()
@@ -375,8 +389,13 @@ class SingleGoalNav(object):
 				print("Lost GPS fix.. Stopping the rover until fix is obtained..")
 				self.wait_for_fix()
 
+			pose_stamp = self.pose_trigger.wait()  # waits for a new pose instead of a fixed sleep
+
+			if pose_stamp is None:
+				continue  # no new pose yet, check for flags, lost fix, etc. again
+
 			_curr_utm = self.current_pos  # gets current utm
-			self.target_index = self.calc_target_index(_curr_utm, self.target_index, self.np_course[:,0], self.np_course[:,1])
+			self.target_index = self.tracker.update(_curr_utm, self.course.easting, self.course.northing, self.course)
 
 			print("target index: {}".format(self.target_index))
 
@@ -384,7 +403,7 @@ class SingleGoalNav(object):
 				print("End of row is reached!")
 				return
 
-			self.current_goal = self.np_course.tolist()[self.target_index]
+			self.current_goal = self.course.point(self.target_index)
 			_curr_angle = self.current_angle  # gets current angle in radians
 
 			A = (_curr_utm[0], _curr_utm[1], _curr_angle)
@@ -404,7 +423,7 @@ class SingleGoalNav(object):
 
 				print("Telling Rover to turn {} degreess..".format(turn_angle))
 
-				self.translate_angle_with_imu(turn_angle)
+				self.translate_angle_with_imu(turn_angle, pose_stamp)
 
 				print("Finished turn.")
 
@@ -418,31 +437,12 @@ class SingleGoalNav(object):
 
 	def calc_target_index(self, current_position, current_goal_index, cx, cy):
 		"""
-		From red_rover_model pure_puruit module. Loops through course
-		points (x and y) and builds a list of the diff b/w robot's position and
-		each x and y in t{he course. Finally, 
+		Finds the closest course point to the robot, then the first point
+		past it that's further than the look-ahead (see target_tracker module).
+		Returns None at the end of the course.
 		"""
-		# note: numpy seems to return blank array if out of index, so
-		# it should return None at end of course.
-
-		dx = [current_position[0] - icx for icx in cx]  # diff b/w robot's position and all x values in course (starting at current goal, onward)
-		dy = [current_position[1] - icy for icy in cy]  # diff b/w robot's position and all y values in course (starting at current goal, onward)
-
-		d = [math.sqrt(idx ** 2 + idy ** 2) for (idx, idy) in zip(dx, dy)]  # scalar diff b/w robot and course values
-
 		print("Determining goal point based on look-ahead of {}".format(self.look_ahead))
-
-		ind = d.index(min(d))  # index of closest goal to robot
-
-		print("Min index: {}".format(ind))
-
-		# loops list, starting at closest point to robot:
-		for _diff in d[ind:]:
-			if _diff > self.look_ahead:
-				return ind				
-			ind += 1
-
-		return None
+		return target_tracker.calc_target_index(current_position, cx, cy, self.look_ahead)
 
 
 
@@ -490,10 +490,11 @@ class SingleGoalNav(object):
 		########################################################################
 
 		_curr_utm = self.current_pos
-		self.target_index = self.calc_target_index(_curr_utm, self.target_index, self.np_course[:,0], self.np_course[:,1])
+		self.target_index = self.calc_target_index(_curr_utm, self.target_index, self.course.easting, self.course.northing)
 
-		updated_path =self.np_course.tolist()[self.target_index:]  # set remaining path to follow
-		self.np_course = np.array(updated_path)  # updates np array of course
+		if self.target_index is not None:
+			self.course = self.course.remaining(self.target_index)  # set remaining path to follow (a view, no copying)
+		self.tracker.reset(0)  # robot is at the start of the remaining path
 
 		self.at_flag = False  # set at_flag to False after sample is collected..
 
@@ -501,11 +502,12 @@ class SingleGoalNav(object):
 
 
 
-	def translate_angle_with_imu(self, goal_angle):
+	def translate_angle_with_imu(self, goal_angle, pose_stamp=None):
 		"""
 		Uses IMU to translate a number of degrees (goal_angle), but stops
 		if it exceeds the turning boundaries of the red rover, which uses
-		the pivot data to determine.
+		the pivot data to determine. pose_stamp is the timestamp of the pose
+		the turn was computed from, for latency reporting.
 		"""
 
 		# Below move_cmd sequence is an attempt to go forward and turn at the same time with the jackal!!!
@@ -526,6 +528,9 @@ class SingleGoalNav(object):
 
 			self.cmd_vel.publish(move_cmd)
 
+			self.pose_trigger.report_latency(pose_stamp)
+			pose_stamp = None  # only the first command counts toward latency
+
 			rospy.sleep(1.0/self.rate)
 
 			curr_angle = self.current_angle
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for the package's hot paths, timed on the field data that's
+shipped with it (analysis/ and courses/).
+
+Each benchmark is run a few times (stdout is silenced while it runs, since
+most of these functions print as they go). The min/median/mean times are
+saved to a results JSON file and compared to a baseline results file:
+benchmarks whose min (best of the repeats, the least noisy of the three)
+time is more than `tolerance` slower than the baseline's are flagged as regressions (exit code 1).
+
+No baseline is committed, since the times depend on the machine: on a fresh
+checkout the first run saves its results as the baseline
+(scripts/nav_benchmark_baseline.json by default) and later runs on that
+machine are compared to it. Run it on the commit you want to compare
+against first (or pass `save` to reset it).
+
+Benchmarks whose requirements aren't installed (e.g., dubins) are skipped,
+and ones that raise are recorded as errors without stopping the others.
+
+Usage: python nav_benchmark.py [results.json] [baseline.json] [save]
+	save - overwrites the baseline with this run's results
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import numpy as np
+
+# Local package requirements:
+import target_tracker
+import row_consolidator
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(package_dir, 'analysis'))
+
+
+
+llh_file = os.path.join(package_dir, 'analysis', 'peanut_field_2018_emlid_log.LLH')
+latlons_file = os.path.join(package_dir, 'analysis', 'peanut_field_2018_latlons.csv')
+row_course_file = os.path.join(package_dir, 'courses', 'peanut_field_2018', 'row_12_course.json')
+filled_course_file = os.path.join(package_dir, 'courses', 'course_13_filled.json')
+multirow_file = os.path.join(package_dir, 'courses', 'multirow', 'annex_13and14_multirow.json')
+
+default_repeats = 5
+default_tolerance = 0.2  # fraction slower than baseline that's flagged as a regression
+min_difference = 0.001  # seconds, differences below this are timer noise
+
+
+
+def read_json(filename):
+	with open(filename, 'r') as json_file:
+		return json.loads(json_file.read())
+
+
+
+def get_course_xy(course):
+	"""
+	Arrays of eastings and northings from a course's flags/goals.
+	"""
+	goals = course.get('flags') or course.get('goals')
+	return (np.array([goal['utmPos']['easting'] for goal in goals]),
+			np.array([goal['utmPos']['northing'] for goal in goals]))
+
+
+
+# Benchmarks: each one sets up its data and returns a function to time.
+
+def bench_calc_target_index(tmp_dir):
+	cx, cy = get_course_xy(read_json(row_course_file))
+	positions = list(zip(cx[::20] + 0.1, cy[::20] - 0.1))  # positions along the course, a little off of it
+
+	def run():
+		for position in positions:
+			target_tracker.calc_target_index(position, cx, cy, 1.5)
+
+	return run
+
+
+
+def bench_tracker_update(tmp_dir):
+	cx, cy = get_course_xy(read_json(row_course_file))
+	positions = list(zip(cx[::2] + 0.1, cy[::2] - 0.1))
+	tracker = target_tracker.TargetTracker(1.5)
+
+	def run():
+		tracker.reset()
+		for position in positions:
+			tracker.update(position, cx, cy)
+
+	return run
+
+
+
+def bench_tracker_update_arc_length(tmp_dir):
+	from nav_course import NavCourse
+	course = NavCourse.from_course(read_json(row_course_file)).resample(0.1)
+	positions = list(zip(course.easting[::20] + 0.1, course.northing[::20] - 0.1))
+	tracker = target_tracker.TargetTracker(1.5, use_arc_length=True)
+
+	def run():
+		tracker.reset()
+		for position in positions:
+			tracker.update(position, course.easting, course.northing, course)
+
+	return run
+
+
+
+def bench_fill_out_flags_file(tmp_dir):
+	from course_file_handler import CourseFileHandler  # needs rosbag (via bag_handler)
+	course = read_json(row_course_file)
+	flags = course.get('flags') or course.get('goals')
+	dec_course = {
+		'units': 'dec',
+		'flags': [{'index': flag['index'], 'decPos': flag['decPos']} for flag in flags]
+	}
+	dec_course_str = json.dumps(dec_course)
+
+	def run():
+		cfh = CourseFileHandler()
+		cfh.flags = json.loads(dec_course_str)  # fresh copy, fill_out_flags_file() updates it
+		cfh.fill_out_flags_file()
+
+	return run
+
+
+
+def bench_nav_nudge(tmp_dir):
+	from nav_nudge import NavNudge
+	with open(row_course_file, 'r') as course_file:
+		file_data = course_file.read()
+
+	def run():
+		NavNudge(file_data, 0.5, 0.2)
+
+	return run
+
+
+
+def bench_handle_dubins(tmp_dir):
+	import dubins_path
+	course_data = read_json(multirow_file)
+
+	def run():
+		dubins_path.handle_dubins(course_data, 1, 2, plot=False)
+
+	return run
+
+
+
+def bench_llh_to_latlons(tmp_dir):
+	from emlid_logfile_parser import LogfileParser
+	output_filename = os.path.join(tmp_dir, 'llh_latlons.csv')
+
+	def run():
+		LogfileParser().convert_emlid_logfile_to_latlons(llh_file, output_filename)
+
+	return run
+
+
+
+def bench_llh_to_course(tmp_dir):
+	from emlid_logfile_parser import LogfileParser
+	output_filename = os.path.join(tmp_dir, 'llh_course.json')
+
+	def run():
+		LogfileParser().convert_emlid_logfile_to_course(llh_file, output_filename)
+
+	return run
+
+
+
+def bench_llh_to_geojson(tmp_dir):
+	from emlid_logfile_parser import LogfileParser
+	output_filename = os.path.join(tmp_dir, 'llh.geojson')
+
+	def run():
+		LogfileParser().convert_emlid_logfile_to_geojson(llh_file, output_filename)
+
+	return run
+
+
+
+def bench_latlon_csv_to_course_array(tmp_dir):
+
+	def run():
+		row_consolidator.convert_latlon_csv_to_course_array(latlons_file)
+
+	return run
+
+
+
+def bench_rowfiles_to_course_array(tmp_dir):
+
+	def run():
+		row_consolidator.convert_rowfiles_to_course_array(filled_course_file)
+
+	return run
+
+
+
+benchmarks = [
+	('calc_target_index', bench_calc_target_index),
+	('tracker_update', bench_tracker_update),
+	('tracker_update_arc_length', bench_tracker_update_arc_length),
+	('fill_out_flags_file', bench_fill_out_flags_file),
+	('nav_nudge', bench_nav_nudge),
+	('handle_dubins', bench_handle_dubins),
+	('llh_to_latlons', bench_llh_to_latlons),
+	('llh_to_course', bench_llh_to_course),
+	('llh_to_geojson', bench_llh_to_geojson),
+	('latlon_csv_to_course_array', bench_latlon_csv_to_course_array),
+	('rowfiles_to_course_array', bench_rowfiles_to_course_array)
+]
+
+
+
+
+
+
+def time_benchmark(setup, tmp_dir, repeats=default_repeats):
+	"""
+	Sets up and times one benchmark. Returns its results dict.
+	"""
+	_stdout = sys.stdout
+	sys.stdout = open(os.devnull, 'w')  # most of the benchmarked functions print a lot
+
+	try:
+		try:
+			run = setup(tmp_dir)
+		except ImportError as e:
+			return {'status': 'skipped', 'reason': str(e)}
+
+		times = []
+		for i in range(repeats):
+			start = time.time()
+			run()
+			times.append(time.time() - start)
+
+	except Exception as e:
+		return {'status': 'error', 'reason': "{}: {}".format(type(e).__name__, e)}
+
+	finally:
+		sys.stdout.close()
+		sys.stdout = _stdout
+
+	return {
+		'status': 'ok',
+		'repeats': repeats,
+		'min': min(times),
+		'median': float(np.median(times)),
+		'mean': float(np.mean(times))
+	}
+
+
+
+def run_benchmarks(repeats=default_repeats):
+	"""
+	Runs all the benchmarks. Returns the results object that's saved as JSON.
+	"""
+	tmp_dir = tempfile.mkdtemp()  # for files the benchmarks write
+
+	results = {
+		'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+		'python': platform.python_version(),
+		'machine': platform.node(),
+		'benchmarks': {}
+	}
+
+	try:
+		for name, setup in benchmarks:
+			result = time_benchmark(setup, tmp_dir, repeats)
+			results['benchmarks'][name] = result
+
+			if result['status'] == 'ok':
+				print("{:<30} median {:9.2f}ms, min {:9.2f}ms".format(name, 1000.0 * result['median'], 1000.0 * result['min']))
+			else:
+				print("{:<30} {} ({})".format(name, result['status'], result['reason']))
+	finally:
+		shutil.rmtree(tmp_dir)
+
+	return results
+
+
+
+def find_regressions(results, baseline, tolerance=default_tolerance):
+	"""
+	List of (name, min time, baseline min time) for benchmarks that are
+	more than tolerance (fraction) slower than the baseline.
+	"""
+	regressions = []
+
+	for name, result in results['benchmarks'].items():
+		base_result = baseline['benchmarks'].get(name)
+
+		if result['status'] != 'ok' or not base_result or base_result['status'] != 'ok':
+			continue
+
+		difference = result['min'] - base_result['min']
+
+		if difference > min_difference and difference > tolerance * base_result['min']:
+			regressions.append((name, result['min'], base_result['min']))
+
+	return regressions
+
+
+
+
+
+
+if __name__ == '__main__':
+
+	results_filename = sys.argv[1] if len(sys.argv) > 1 else 'benchmark_results.json'
+	baseline_filename = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nav_benchmark_baseline.json')
+	save_baseline = len(sys.argv) > 3 and sys.argv[3] == 'save'
+
+	results = run_benchmarks()
+
+	with open(results_filename, 'w') as results_file:
+		results_file.write(json.dumps(results, indent=2, sort_keys=True))
+	print("Results saved to {}".format(results_filename))
+
+	if save_baseline or not os.path.exists(baseline_filename):
+		shutil.copyfile(results_filename, baseline_filename)
+		print("Results saved as baseline {}".format(baseline_filename))
+		sys.exit(0)
+
+	regressions = find_regressions(results, read_json(baseline_filename))
+
+	for name, min_time, base_min_time in regressions:
+		print("REGRESSION: {} {:.2f}ms vs. baseline {:.2f}ms ({:+.0f}%)".format(
+			name, 1000.0 * min_time, 1000.0 * base_min_time, 100.0 * (min_time / base_min_time - 1.0)))
+
+	if regressions:
+		sys.exit(1)
+
+	print("No regressions against baseline {}".format(baseline_filename))
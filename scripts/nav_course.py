@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+"""
+Python module for an array-backed course for the robot to follow.
+
+The course's eastings and northings are kept in two contiguous float64
+numpy arrays. Reading a point is O(1), and the remaining path after a flag,
+or a single row of a multirow course, is a view into the same arrays
+(no copies), which also shares the course's spatial index.
+
+Per-point profiles (cumulative arc length, heading, curvature) and each
+row's angle are computed once on the base course the first time they're
+needed, and saved with the course in course_cache, so the drive loops and
+dubins turns just index into them.
+"""
+
+import numpy as np
+from course_index import CourseIndex
+
+
+
+class NavCourse(object):
+	"""
+	A course of [easting, northing] points. Build one with the from_*
+	class methods rather than the constructor.
+	"""
+
+	def __init__(self, easting, northing, offset=0, base=None):
+
+		self.easting = easting  # contiguous float64 array (or view) of eastings
+		self.northing = northing  # contiguous float64 array (or view) of northings
+		self.offset = offset  # index of this course's first point in the base course
+		self.base = base if base is not None else self  # course that owns the arrays (self unless this is a view)
+
+		self.row_starts = np.zeros(1, dtype=np.int64)  # index where each row starts (multirow courses)
+		self.row_names = [None]  # row 'index' values from multirow courses
+		self.spacing = None  # distance (meters) between points if the course was resampled
+
+		self._index = None  # lazy spatial index, only built on the base course
+		self._arc_length = None  # lazy cumulative distances, only on the base course
+		self._headings = None  # lazy point headings, only on the base course
+		self._curvature = None  # lazy point curvatures, only on the base course
+		self._row_angles = None  # lazy row angles, only on the base course
+
+
+
+	@classmethod
+	def from_points(cls, points):
+		"""
+		Builds a course from a list/array of [easting, northing] pairs.
+		"""
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		return cls(np.ascontiguousarray(points[:,0]), np.ascontiguousarray(points[:,1]))
+
+
+
+	@classmethod
+	def from_course(cls, course):
+		"""
+		Builds a course from a course JSON object, either a single course
+		({'flags': [..]} or {'goals': [..]} with 'utmPos' objects) or a
+		multirow course ({'rows': [{'index': .., 'row': ..}, ..]}, where each
+		row is a list of [easting, northing] pairs or a single course object).
+		"""
+		if course.get('rows') is None:
+			return cls.from_points(get_course_points(course))
+
+		rows_points, row_names = [], []
+		for row_obj in course['rows']:
+			row = row_obj.get('row')
+			if isinstance(row, dict):
+				row = get_course_points(row)
+			rows_points.append(row)
+			row_names.append(row_obj.get('index'))
+
+		return cls.from_rows(rows_points, row_names)
+
+
+
+	@classmethod
+	def from_rows(cls, rows_points, row_names=None):
+		"""
+		Builds a multirow course from a list of rows, each a list/array of
+		[easting, northing] pairs, and optionally their names.
+		"""
+		if len(rows_points) == 0:
+			return cls.from_points([])
+
+		rows_points = [np.asarray(row, dtype=np.float64).reshape(-1, 2) for row in rows_points]
+
+		nav_course = cls.from_points(np.concatenate(rows_points) if rows_points else [])
+		nav_course.row_starts = np.cumsum([0] + [len(row) for row in rows_points[:-1]]).astype(np.int64)
+		nav_course.row_names = list(row_names) if row_names is not None else [None] * len(nav_course.row_starts)
+
+		return nav_course
+
+
+
+	def __len__(self):
+		return len(self.easting)
+
+
+
+	def point(self, i):
+		"""
+		Returns [easting, northing] of the i-th point in the course.
+		"""
+		return [float(self.easting[i]), float(self.northing[i])]
+
+
+
+	def tolist(self):
+		"""
+		List of [easting, northing] pairs (copies the course, so avoid
+		in drive loops).
+		"""
+		return np.column_stack((self.easting, self.northing)).tolist()
+
+
+
+	def view(self, start, stop=None):
+		"""
+		Course made of points start to stop (exclusive) of this one,
+		without copying the arrays.
+		"""
+		stop = len(self) if stop is None else stop
+		course = NavCourse(self.easting[start:stop], self.northing[start:stop], self.offset + start, self.base)
+		course.spacing = self.spacing
+		return course
+
+
+
+	def remaining(self, start):
+		"""
+		The rest of the course from index start onward (e.g., after
+		stopping at a flag), without copying the arrays.
+		"""
+		return self.view(start)
+
+
+
+	def rows(self):
+		"""
+		List of (row name, row course) for a multirow course, each row
+		being a view into this course.
+		"""
+		bounds = list(self.row_starts) + [len(self)]
+		return [(self.row_names[i], self.view(int(bounds[i]), int(bounds[i + 1]))) for i in range(len(self.row_names))]
+
+
+
+	@property
+	def index(self):
+		"""
+		Spatial index (see course_index module) of the base course, built
+		the first time it's needed.
+		"""
+		if self.base._index is None:
+			self.base._index = CourseIndex(np.column_stack((self.base.easting, self.base.northing)))
+		return self.base._index
+
+
+
+	@property
+	def arc_length(self):
+		"""
+		Cumulative distance (meters) along the base course from its first
+		point to each point of this course, computed the first time it's needed.
+		"""
+		base = self.base
+		if base._arc_length is None:
+			arc_length = np.zeros(len(base))
+			arc_length[1:] = np.cumsum(np.hypot(np.diff(base.easting), np.diff(base.northing)))
+			base._arc_length = arc_length
+		return base._arc_length[self.offset:self.offset + len(self)]
+
+
+
+	@property
+	def headings(self):
+		"""
+		Heading (radians, 0 at East, CCW) of the segment from each point
+		to the next one (the last point gets the last segment's heading),
+		computed the first time it's needed. Repeated points (zero length
+		segments) get the heading of the segment before them.
+		"""
+		base = self.base
+		if base._headings is None:
+			headings = np.zeros(len(base))
+			if len(base) > 1:
+				dx, dy = np.diff(base.easting), np.diff(base.northing)
+				moved = (dx != 0) | (dy != 0)
+				if moved.any():
+					# last segment with a length at or before each one (the first one for repeats at the start):
+					last_moved = np.maximum.accumulate(np.where(moved, np.arange(len(dx)), -1))
+					last_moved[last_moved < 0] = np.argmax(moved)
+					headings[:-1] = np.arctan2(dy, dx)[last_moved]
+				headings[-1] = headings[-2]
+			base._headings = headings
+		return base._headings[self.offset:self.offset + len(self)]
+
+
+
+	@property
+	def curvature(self):
+		"""
+		Signed curvature (1/meters, positive turning left) at each point:
+		the change in heading between the segments before and after it,
+		over the average of their lengths. 0 at the ends of the course.
+		Computed the first time it's needed.
+		"""
+		base = self.base
+		if base._curvature is None:
+			curvature = np.zeros(len(base))
+			if len(base) > 2:
+				seg_lengths = np.diff(base.arc_length)
+				dtheta = (np.diff(base.headings[:-1]) + np.pi) % (2.0 * np.pi) - np.pi
+				ds = (seg_lengths[:-1] + seg_lengths[1:]) / 2.0
+				curvature[1:-1] = np.where(ds > 0, dtheta / np.where(ds > 0, ds, 1.0), 0.0)
+			base._curvature = curvature
+		return base._curvature[self.offset:self.offset + len(self)]
+
+
+
+	@property
+	def row_angles(self):
+		"""
+		Angle (radians, 0 at East, CCW) of each row of the base course,
+		from its first point to its last one (see dubins_path.get_row_angle),
+		computed the first time it's needed.
+		"""
+		base = self.base
+		if base._row_angles is None:
+			starts = base.row_starts.astype(np.int64)
+			ends = np.append(starts[1:], len(base)) - 1
+			ends = np.maximum(ends, starts)
+			if len(base) > 0:
+				base._row_angles = np.arctan2(base.northing[ends] - base.northing[starts], base.easting[ends] - base.easting[starts])
+			else:
+				base._row_angles = np.zeros(len(starts))
+		return base._row_angles
+
+
+
+	def precompute(self):
+		"""
+		Computes the base course's profiles now (e.g., when a drive node
+		loads its course) rather than on the first drive loop tick.
+		"""
+		self.arc_length, self.headings, self.curvature, self.row_angles
+		return self
+
+
+
+	def resample(self, spacing):
+		"""
+		New course with points every spacing meters along each row of this
+		one (plus each row's last point), so points are spread by distance
+		rather than by GPS rate and speed.
+		"""
+		eastings, northings, row_starts = [], [], []
+
+		for row_name, row in self.rows():
+			if len(row) == 0:
+				continue
+			arc_length = row.arc_length - row.arc_length[0]
+			samples = np.arange(0.0, arc_length[-1], spacing)
+			samples = np.append(samples, arc_length[-1]) if len(samples) > 0 else arc_length[-1:]
+			row_starts.append(sum(len(e) for e in eastings))
+			eastings.append(np.interp(samples, arc_length, row.easting))
+			northings.append(np.interp(samples, arc_length, row.northing))
+
+		if not eastings:
+			return NavCourse.from_points([])
+
+		course = NavCourse(np.concatenate(eastings), np.concatenate(northings))
+		course.row_starts = np.array(row_starts, dtype=np.int64)
+		course.row_names = [row_name for row_name, row in self.rows() if len(row) > 0]
+		course.spacing = spacing
+
+		return course
+
+
+
+	def nearest(self, position, min_index=0):
+		"""
+		Closest point in this course (index >= min_index) to a position.
+		Returns (index, distance) with the index relative to this course,
+		or (None, None).
+		"""
+		ind, dist = self.index.nearest(position, self.offset + min_index, self.offset + len(self))
+		if ind is None:
+			return None, None
+		return ind - self.offset, dist
+
+
+
+	def within(self, position, radius):
+		"""
+		Indices (relative to this course) of points within a radius of a position.
+		"""
+		return self.index.within(position, radius, self.offset, self.offset + len(self)) - self.offset
+
+
+
+
+
+
+def get_course_points(course):
+	"""
+	List of [easting, northing] pairs from a course object's
+	'flags' (or 'goals') 'utmPos' values.
+	"""
+	goals = course.get('flags')
+
+	if not goals:
+		goals = course.get('goals')
+
+	if not goals:
+		raise Exception("Could not find flags or goals in course object, nav_course module..")
+
+	return [[goal['utmPos']['easting'], goal['utmPos']['northing']] for goal in goals]
@@ -1,8 +1,14 @@
 import numpy as np
 import sys
 import math
+import bisect
 import matplotlib.pyplot as plt
-import json
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+from nav_course import NavCourse
+import course_stream
 
 
 
@@ -24,46 +30,84 @@ class NavNudge(object):
 
 
     def offset(self, coordinates, distance):
-        coordinates = iter(coordinates)
-        x1, y1 = coordinates.next()
-        z = distance
-        points = []
-        for x2, y2 in coordinates:
-            # tangential slope approximation
-            try:
-                slope = (y2 - y1) / (x2 - x1)
-                # perpendicular slope
-                pslope = -1/slope  # (might be 1/slope depending on direction of travel)
-            except ZeroDivisionError:
-                continue
-            mid_x = (x1 + x2) / 2
-            mid_y = (y1 + y2) / 2
+        """
+        Shifts a course sideways by distance (meters, positive to the right
+        of the direction of travel, negative to the left). Returns a point
+        for each segment, at its midpoint moved along the segment's unit
+        normal. Repeated points (zero length segments) use the normal of
+        the segment before them, so no segments are dropped.
+        """
+        points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+
+        if len(points) < 2:
+            return []
 
-            sign = ((pslope > 0) == (x1 > x2)) * 2 - 1
+        tangents = np.diff(points, axis=0)
+        lengths = np.hypot(tangents[:,0], tangents[:,1])
 
-            delta_x = sign * z / ((1 + pslope**2)**0.5)
-            delta_y = pslope * delta_x
+        moved = lengths > 0
+        if not moved.any():
+            return []  # no direction to offset in
 
-            points.append([mid_x + delta_x, mid_y + delta_y])
-            x1, y1 = x2, y2
-        return points
+        # segment to take each segment's direction from (itself unless it has no length):
+        last_moved = np.maximum.accumulate(np.where(moved, np.arange(len(lengths)), -1))
+        last_moved[last_moved < 0] = np.argmax(moved)
+
+        tangents = tangents[last_moved] / lengths[last_moved][:,np.newaxis]
+        normals = np.column_stack((tangents[:,1], -tangents[:,0]))  # right-hand side of travel
+
+        midpoints = (points[:-1] + points[1:]) / 2.0
+
+        return (midpoints + distance * normals).tolist()
 
 
 
     def parse_by_space_factor(self):
+        """
+        Course points spaced more than space_factor apart: starting from the
+        first point, the next point kept is the first one further than
+        space_factor from the last one kept (the first point itself isn't
+        included). Returns an array of [easting, northing] rows.
+
+        Runs of points that are each further than space_factor from the
+        point before them are all kept, found from the course's point to
+        point distances in one pass, so only points closer together than
+        that (e.g., when the rover was slow or stopped) are checked one at
+        a time.
+        """
+        points = np.asarray(self.course_data, dtype=np.float64).reshape(-1, 2)
+        num_points = len(points)
+
+        if num_points < 2:
+            return []
+
+        gaps = np.diff(points, axis=0)
+        close = (np.flatnonzero(np.sqrt(gaps[:,0]**2 + gaps[:,1]**2) <= self.space_factor) + 1).tolist()  # points close to the one before
+        xs, ys = points[:,0].tolist(), points[:,1].tolist()
+
+        kept = []
+        i = 1  # next point to check, the last one kept (or the first point) is always i - 1
 
-        parsed_array = []
-        prev_xy = self.course_data[0]
+        while i < num_points:
+
+            run_end = close[bisect.bisect_left(close, i)] if close and close[-1] >= i else num_points
+
+            if run_end > i:
+                kept.extend(range(i, run_end))  # each is far enough from the one before it
+                i = run_end
+                continue
 
-        for i in range(1, len(self.course_data)):
-            
-            d = math.sqrt( (self.course_data[i][0] - prev_xy[0])**2 + (self.course_data[i][1] - prev_xy[1])**2 )
+            # point i is too close to the last one kept, finds the next one that isn't:
+            prev_x, prev_y = xs[i - 1], ys[i - 1]
+            j = i + 1
+            while j < num_points and math.sqrt((xs[j] - prev_x)**2 + (ys[j] - prev_y)**2) <= self.space_factor:
+                j += 1
 
-            if d > self.space_factor:
-                parsed_array.append([self.course_data[i][0], self.course_data[i][1]])  # building array of course points spaced by space_factor..
-                prev_xy = self.course_data[i]  # sets current x,y to prev for next iteration..
+            if j < num_points:
+                kept.append(j)
+            i = j + 1
 
-        return parsed_array
+        return points[kept]
 
 
 
@@ -88,18 +132,18 @@ class NavNudge(object):
 
     def build_array_from_json(self):
         """
-        Builds array (list of easting,northing pairs) from course JSON.
+        Builds array (rows of easting,northing pairs) from course JSON
+        (a string or an open course file, streamed a flag at a time),
+        or from a NavCourse (e.g., a binary course file).
         """
-        course_json = json.loads(self.course_data)
-        array_data = []
+        if isinstance(self.course_data, NavCourse):
+            if len(self.course_data.row_starts) > 1:
+                raise Exception("NavNudge nudges one row at a time, nudge each of the course's rows() instead.")
+            return np.column_stack((self.course_data.easting, self.course_data.northing))[:-1]  # same points as from the course's JSON
 
-        for i in range(0, len(course_json.get('flags')) - 1):
-            pos_obj = course_json['flags'][i]
-            easting = pos_obj['utmPos']['easting']
-            northing = pos_obj['utmPos']['northing']
-            array_data.append([easting, northing])
+        course_file = self.course_data if hasattr(self.course_data, 'read') else StringIO(self.course_data)
 
-        return array_data
+        return np.array(list(course_stream.iter_course_points(course_file, 'utm')), dtype=np.float64).reshape(-1, 2)
 
 
 
@@ -118,8 +162,9 @@ if __name__ == '__main__':
     # with open(course_filename) as f:
     #     f.next()
     #     data = [[float(x) for x in line.split(',')] for line in f if line.strip()]
-    file_data = open(course_filename, 'r').read()
+    course_file = open(course_filename, 'r')  # course is streamed from the file
 
 
-    nav_nudge = NavNudge(file_data, nudge_factor, space_factor)
+    nav_nudge = NavNudge(course_file, nudge_factor, space_factor)
+    course_file.close()
     nav_nudge.plot_results()
\ No newline at end of file
@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+
+"""
+ROS-free simulator for trying out the drive nodes' target selection and
+steering on a course without taking a robot to the field.
+
+Runs the same pieces SingleGoalNav uses (target_tracker.TargetTracker,
+orientation_transforms for the incremental IMU turns, and the pure_pursuit
+module) against a kinematic model of the Jackal (skid-steer) or the red
+rover (articulated), with GPS and IMU readings at configurable rates and
+noise. Simulated time is stepped as fast as the computer allows, and a run
+reports how long the course took, the cross-track error and the number of
+commands issued.
+
+Usage: python nav_simulator.py course.json [jackal|red_rover] [incremental|pure_pursuit] [gps_noise_m] [resample_spacing_m]
+"""
+
+import os
+import sys
+import time
+from math import atan2, cos, sin, sqrt, radians, degrees, pi
+import numpy as np
+
+# Local package requirements:
+from nav_course import NavCourse
+import course_binary
+import target_tracker
+import orientation_transforms
+import pure_pursuit
+
+
+
+class SkidSteerModel(object):
+	"""
+	Unicycle model of the Jackal, driven by Twist-like (linear, angular) commands.
+	"""
+
+	def __init__(self, x, y, heading, max_angular_speed=1.0):
+
+		self.x, self.y = x, y
+		self.heading = heading  # radians, 0 at East, CCW
+		self.max_angular_speed = max_angular_speed
+
+		self.linear = 0.0  # commanded linear speed (m/s)
+		self.angular = 0.0  # commanded angular speed (rad/s)
+
+
+
+	def step(self, dt):
+		angular = max(-self.max_angular_speed, min(self.max_angular_speed, self.angular))
+		self.x += self.linear * cos(self.heading) * dt
+		self.y += self.linear * sin(self.heading) * dt
+		self.heading = pure_pursuit.normalize_angle(self.heading + angular * dt)
+
+
+
+
+
+
+class ArticulatedModel(object):
+	"""
+	Center-articulated model of the red rover. The articulation relay
+	turns the joint left (+1), right (-1) or holds it where it is (0),
+	at a fixed rate.
+	The heading is the front body's.
+	"""
+
+	def __init__(self, x, y, heading, speed=0.5, front_length=1.0, rear_length=1.0,
+			articulation_rate=radians(10.0), max_articulation=radians(35.0)):
+
+		self.x, self.y = x, y
+		self.heading = heading  # radians, 0 at East, CCW
+		self.speed = speed  # m/s when driving
+		self.front_length = front_length  # front axle to joint (m)
+		self.rear_length = rear_length  # rear axle to joint (m)
+		self.articulation_rate = articulation_rate  # rad/s
+		self.max_articulation = max_articulation  # rad
+
+		self.articulation = 0.0  # joint angle, positive is left
+		self.direction = 0  # articulation relay command
+		self.driving = False
+
+
+
+	def step(self, dt):
+		self.articulation += self.direction * self.articulation_rate * dt
+		self.articulation = max(-self.max_articulation, min(self.max_articulation, self.articulation))
+
+		if not self.driving:
+			return
+
+		gamma = self.articulation
+		yaw_rate = self.speed * sin(gamma) / (self.front_length * cos(gamma) + self.rear_length)
+
+		self.x += self.speed * cos(self.heading) * dt
+		self.y += self.speed * sin(self.heading) * dt
+		self.heading = pure_pursuit.normalize_angle(self.heading + yaw_rate * dt)
+
+
+
+
+
+
+class NavSimulator(object):
+	"""
+	Drives a simulated robot along a NavCourse with the drive nodes'
+	target selection and steering.
+	"""
+
+	def __init__(self, course, robot='jackal', steering_mode='incremental', look_ahead=1.5,
+			gps_rate=5.0, gps_noise=0.02, imu_rate=50.0, imu_noise=radians(0.5),
+			control_rate=10.0, dt=0.01, seed=0, use_arc_length=False, max_lateral_accel=None):
+
+		self.course = course  # NavCourse to follow
+		self.robot = robot  # 'jackal' or 'red_rover'
+		self.steering_mode = steering_mode  # 'incremental' or 'pure_pursuit'
+
+		self.gps_rate = gps_rate  # fixes per second
+		self.gps_noise = gps_noise  # std. dev. of fix position noise (m)
+		self.imu_rate = imu_rate  # imu readings per second
+		self.imu_noise = imu_noise  # std. dev. of imu yaw noise (rad)
+		self.control_rate = control_rate  # max control steps/s (and rate of turn loop ticks)
+		self.dt = dt  # simulation time step (s)
+
+		self.random = np.random.RandomState(seed)
+
+		self.tracker = target_tracker.TargetTracker(look_ahead, use_arc_length=use_arc_length)
+
+		# Same settings as the drive nodes:
+		self.angle_tolerance = 0.1  # degrees
+		self.angle_trim = 2.0  # degrees
+		self.linear_speed = 0.3  # jackal (m/s)
+		self.angular_speed = 0.1  # jackal incremental turns (rad/s)
+		self.max_angular_speed = 0.5  # jackal pure pursuit (rad/s)
+		self.max_lateral_accel = max_lateral_accel  # jackal pure pursuit speed scheduling (m/s^2), off if None
+		self.min_linear_speed = 0.1  # jackal (m/s)
+		self.articulation_deadband = 0.05  # red rover pure pursuit (1/m)
+
+		self.model = self.build_model()
+
+
+
+	def build_model(self):
+		"""
+		Robot model at the start of the course, facing down the course.
+		"""
+		start = self.course.point(0)
+		ahead_ind = self.course.within(start, 2.0)
+		ahead = self.course.point(int(ahead_ind.max())) if len(ahead_ind) > 0 else start
+
+		if ahead == start and len(self.course) > 1:
+			ahead = self.course.point(len(self.course) - 1)
+
+		heading = atan2(ahead[1] - start[1], ahead[0] - start[0])
+
+		if self.robot == 'jackal':
+			return SkidSteerModel(start[0], start[1], heading, max_angular_speed=1.0)
+		elif self.robot == 'red_rover':
+			return ArticulatedModel(start[0], start[1], heading)
+
+		raise Exception("Unknown robot '{}', use 'jackal' or 'red_rover'".format(self.robot))
+
+
+
+	def read_gps(self):
+		return [self.model.x + self.random.normal(0.0, self.gps_noise),
+				self.model.y + self.random.normal(0.0, self.gps_noise)]
+
+
+
+	def read_imu(self):
+		"""
+		Yaw like the drive nodes get it from the IMU (0 at North).
+		"""
+		yaw = self.model.heading - pi / 2.0 + self.random.normal(0.0, self.imu_noise)
+		return pure_pursuit.normalize_angle(yaw)
+
+
+
+	def set_turn(self, direction):
+		"""
+		Turn command: 1 left, -1 right, 0 straight.
+		"""
+		if self.robot == 'jackal':
+			self.model.linear = self.linear_speed
+			self.model.angular = direction * self.angular_speed
+		else:
+			self.model.direction = direction
+
+
+
+	def control_step(self, position, imu_angle):
+		"""
+		One pass of the drive loop for a new pose. Returns the target index
+		(None at the end of the course) and the incremental turn to start
+		(radians, 0 if none).
+		"""
+		target_index = self.tracker.update(position, self.course.easting, self.course.northing, self.course)
+
+		if target_index is None:
+			return None, 0.0
+
+		goal = self.course.point(target_index)
+
+		if self.steering_mode == 'pure_pursuit':
+			curvature = pure_pursuit.calc_curvature(position, imu_angle, goal)
+			if self.robot == 'jackal':
+				linear_speed = self.linear_speed
+				if self.max_lateral_accel:
+					linear_speed = pure_pursuit.calc_scheduled_speed(self.course.curvature[target_index], self.linear_speed, self.min_linear_speed, self.max_lateral_accel)
+				self.model.linear = linear_speed
+				self.model.angular = pure_pursuit.calc_angular_velocity(curvature, linear_speed, self.max_angular_speed)
+			else:
+				self.model.direction = pure_pursuit.calc_articulation_direction(curvature, self.articulation_deadband)
+			return target_index, 0.0
+
+		A = (position[0], position[1], imu_angle)
+		B = (goal[0], goal[1], 0)
+		turn_angle = orientation_transforms.initiate_angle_transform(A, B)  # positive turns left
+
+		if abs(turn_angle) <= abs(self.angle_tolerance):
+			return target_index, 0.0
+
+		turn_angle = max(-self.angle_trim, min(self.angle_trim, turn_angle))
+
+		return target_index, radians(turn_angle)
+
+
+
+	def run(self, max_time=None, quiet=True):
+		"""
+		Runs the course. Returns a dict of results. max_time (simulated
+		seconds) defaults to three times the course length at the robot's speed.
+		"""
+		speed = self.linear_speed if self.robot == 'jackal' else self.model.speed
+		if max_time is None:
+			max_time = 3.0 * max(self.course_length(), 1.0) / speed + 10.0
+
+		_stdout = sys.stdout
+		if quiet:
+			sys.stdout = open(os.devnull, 'w')  # the drive logic prints every step
+
+		try:
+			results = self.simulate(max_time)
+		finally:
+			if quiet:
+				sys.stdout.close()
+				sys.stdout = _stdout
+
+		return results
+
+
+
+	def simulate(self, max_time):
+
+		wall_start = time.time()
+
+		t = 0.0
+		next_gps, next_imu, next_tick = 0.0, 0.0, 0.0
+		last_step = None
+		new_fix = False
+
+		position, imu_angle = None, None
+		turn_goal, turned, last_turn_angle = 0.0, 0.0, None  # incremental turn in progress
+
+		commands, control_steps, gps_fixes = 0, 0, 0
+		cross_track = []
+		completed = False
+
+		self.tracker.reset()
+
+		# start driving straight:
+		self.set_turn(0)
+		if self.robot == 'red_rover':
+			self.model.driving = True
+		commands += 1
+
+		while t < max_time:
+
+			if t >= next_gps:
+				position = self.read_gps()
+				new_fix = True
+				gps_fixes += 1
+				next_gps += 1.0 / self.gps_rate
+				cross_track.append(self.cross_track_error([self.model.x, self.model.y]))
+
+			if t >= next_imu:
+				imu_angle = self.read_imu()
+				next_imu += 1.0 / self.imu_rate
+
+			if turn_goal != 0.0:
+				# translate_angle_with_imu: keeps turning, checking imu every tick
+				if t >= next_tick:
+					delta = pure_pursuit.normalize_angle(imu_angle - last_turn_angle)
+					turned += delta
+					last_turn_angle = imu_angle
+					if abs(turned) >= abs(turn_goal) or delta == 0.0:
+						turn_goal = 0.0
+						self.set_turn(0)
+						commands += 1
+					else:
+						commands += 1  # turn command republished each tick
+					next_tick = t + 1.0 / self.control_rate
+
+			elif new_fix and (last_step is None or t - last_step >= 1.0 / self.control_rate - 1e-9):
+				new_fix = False
+				last_step = t
+				control_steps += 1
+
+				target_index, turn = self.control_step(position, imu_angle)
+
+				if target_index is None:
+					completed = True
+					break
+
+				if self.steering_mode == 'pure_pursuit':
+					commands += 1
+				elif turn != 0.0:
+					turn_goal, turned, last_turn_angle = turn, 0.0, imu_angle
+					self.set_turn(1 if turn > 0 else -1)
+					commands += 1
+					next_tick = t + 1.0 / self.control_rate
+
+			self.model.step(self.dt)
+			t += self.dt
+
+		wall_time = time.time() - wall_start
+		cross_track = np.array(cross_track) if cross_track else np.zeros(1)
+
+		return {
+			'completed': completed,
+			'sim_time': t,
+			'wall_time': wall_time,
+			'speedup': t / wall_time if wall_time > 0 else float('inf'),
+			'cross_track_mean': float(np.mean(cross_track)),
+			'cross_track_rms': float(np.sqrt(np.mean(cross_track**2))),
+			'cross_track_max': float(np.max(cross_track)),
+			'commands': commands,
+			'control_steps': control_steps,
+			'gps_fixes': gps_fixes,
+			'global_searches': self.tracker.global_searches
+		}
+
+
+
+	def course_length(self):
+		return float(np.sum(np.hypot(np.diff(self.course.easting), np.diff(self.course.northing))))
+
+
+
+	def cross_track_error(self, position):
+		"""
+		Distance from a position to the course's closest segment.
+		"""
+		ind, dist = self.course.nearest(position)
+
+		if ind is None:
+			return 0.0
+
+		best = dist
+		for i in (ind - 1, ind):
+			if i < 0 or i + 1 >= len(self.course):
+				continue
+			best = min(best, point_to_segment_distance(position, self.course.point(i), self.course.point(i + 1)))
+
+		return best
+
+
+
+
+
+
+def point_to_segment_distance(p, a, b):
+	"""
+	Distance from point p to the line segment a->b.
+	"""
+	abx, aby = b[0] - a[0], b[1] - a[1]
+	seg_len2 = abx**2 + aby**2
+
+	if seg_len2 == 0:
+		return sqrt((p[0] - a[0])**2 + (p[1] - a[1])**2)
+
+	u = ((p[0] - a[0]) * abx + (p[1] - a[1]) * aby) / seg_len2
+	u = max(0.0, min(1.0, u))
+
+	return sqrt((p[0] - a[0] - u * abx)**2 + (p[1] - a[1] - u * aby)**2)
+
+
+
+
+
+
+if __name__ == '__main__':
+
+	try:
+		course_filename = sys.argv[1]
+	except IndexError:
+		raise IndexError("Course not specified. Usage: python nav_simulator.py course.json [jackal|red_rover] [incremental|pure_pursuit] [gps_noise_m] [resample_spacing_m]")
+
+	robot = sys.argv[2] if len(sys.argv) > 2 else 'jackal'
+	steering_mode = sys.argv[3] if len(sys.argv) > 3 else 'incremental'
+	gps_noise = float(sys.argv[4]) if len(sys.argv) > 4 else 0.02
+	spacing = float(sys.argv[5]) if len(sys.argv) > 5 else None  # resamples the course and looks ahead by arc length
+
+	course = course_binary.load_course_file(course_filename)  # JSON or binary (.navc) course file
+	if not isinstance(course, NavCourse):
+		course = NavCourse.from_course(course)
+
+	if spacing:
+		course = course.resample(spacing)
+
+	print("Simulating {} ({} steering) on {} ({} points)..".format(robot, steering_mode, course_filename, len(course)))
+
+	sim = NavSimulator(course, robot, steering_mode, gps_noise=gps_noise, use_arc_length=spacing is not None)
+	results = sim.run()
+
+	for key in sorted(results.keys()):
+		print("{}: {}".format(key, results[key]))
@@ -9,6 +9,7 @@ that are intended for the robot to follow.
 """
 
 import utm
+from nav_course import NavCourse
 
 
 
@@ -54,9 +55,14 @@ class NavTracks(object):
 		"""
 		Takes position file in format of goals, and grabs the
 		UTM positions to build a list of UTM x,y positions (e.g., 
-		the hard-coded tracks in the __init__ function)
+		the hard-coded tracks in the __init__ function). Also takes
+		a NavCourse (e.g., a binary course file, see
+		course_binary module).
 		"""
 
+		if isinstance(course, NavCourse):
+			return course.tolist()
+
 		goals = course.get('goals')  # get list of goals
 		track_list = []  # track list from course positions
 
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+"""
+Python module for running the drive nodes' control step when a new GPS
+fix arrives, instead of polling on a fixed sleep.
+
+The /fix callback calls notify() with the fix's timestamp (IMU messages
+only update the rover's angle, they don't start a step). The drive loop
+calls wait(), which blocks until there's a fix it hasn't handled yet (but
+no faster than max_rate), and report_latency() when the step publishes a
+command, which keeps stats on the time from the fix's timestamp to the
+command.
+"""
+
+import threading
+import time
+
+
+
+class PoseTrigger(object):
+	"""
+	Wakes up the drive loop when a new fix arrives, at most max_rate
+	times per second.
+	"""
+
+	def __init__(self, max_rate=10.0, clock=time.time, report_every=50):
+
+		self.max_rate = max_rate  # max control steps per second (None for no limit)
+		self.clock = clock  # returns current time in seconds (e.g., rospy.get_time), same clock as stamps
+		self.report_every = report_every  # print latency stats every this many steps
+
+		self.condition = threading.Condition()
+		self.fix_count = 0  # number of fixes received
+		self.handled_count = 0  # fix_count as of the last step
+		self.fix_stamp = None  # timestamp (seconds) of the latest fix
+		self.last_step_time = None  # clock time of the last step
+
+		self.latencies = []  # latencies (seconds) since the last report
+		self.last_latency = None
+		self.steps = 0
+
+
+
+	def notify(self, stamp=None):
+		"""
+		Called from the /fix callback when a new fix arrives.
+		"""
+		with self.condition:
+			self.fix_count += 1
+			self.fix_stamp = stamp if stamp else self.clock()
+			self.condition.notify_all()
+
+
+
+	def wait(self, timeout=0.5):
+		"""
+		Blocks until there's a new fix, then returns its timestamp. Returns
+		None if no fix arrives within timeout, so the caller can check for
+		flags, shutdown, etc. Each fix is returned at most once.
+		"""
+		if self.max_rate and self.last_step_time is not None:
+			delay = self.last_step_time + 1.0 / self.max_rate - self.clock()
+			if delay > 0:
+				time.sleep(delay)
+
+		with self.condition:
+			if self.fix_count == self.handled_count:
+				self.condition.wait(timeout)
+			if self.fix_count == self.handled_count:
+				return None
+			self.handled_count = self.fix_count
+			stamp = self.fix_stamp
+
+		self.last_step_time = self.clock()
+		return stamp
+
+
+
+	def report_latency(self, stamp):
+		"""
+		Records the latency from a fix's timestamp to now (called right
+		after its command is published), printing stats every report_every
+		steps.
+		"""
+		if stamp is None:
+			return
+
+		self.last_latency = self.clock() - stamp
+		self.latencies.append(self.last_latency)
+		self.steps += 1
+
+		if len(self.latencies) >= self.report_every:
+			print("Control step latency over last {} steps: mean {:.1f}ms, max {:.1f}ms".format(
+				len(self.latencies),
+				1000.0 * sum(self.latencies) / len(self.latencies),
+				1000.0 * max(self.latencies)))
+			self.latencies = []
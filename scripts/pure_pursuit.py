@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+Pure pursuit (curvature-based) steering for the drive nodes.
+
+Unlike translate_angle_with_imu, which blocks until the IMU shows a
+turn was made, these functions compute a steering command from the
+robot's pose and the look-ahead goal, so the drive loop can publish a
+new command on every control step.
+
+Angles follow the drive nodes' conventions: the IMU yaw is 0 at North
+(see orientation_transforms.transform_imu_frame), and a positive heading
+error or curvature means turning left (counter-clockwise).
+"""
+
+from math import atan2, sin, hypot, pi, sqrt
+
+
+
+def normalize_angle(angle):
+	"""
+	Wraps an angle (radians) to [-pi, pi).
+	"""
+	return (angle + pi) % (2.0 * pi) - pi
+
+
+
+def calc_heading_error(current_position, current_angle, goal):
+	"""
+	Angle (radians) between the robot's heading and the line from
+	the robot to the goal. current_angle is the IMU yaw in radians.
+	"""
+	heading = current_angle + pi / 2.0  # IMU frame (0 at North) -> 0 at East, CCW
+	bearing = atan2(goal[1] - current_position[1], goal[0] - current_position[0])
+	return normalize_angle(bearing - heading)
+
+
+
+def calc_curvature(current_position, current_angle, goal):
+	"""
+	Curvature (1/meters) of the arc from the robot's pose through
+	the goal, i.e., 2*sin(alpha)/L for heading error alpha and distance L
+	to the goal.
+	"""
+	look_ahead = hypot(goal[0] - current_position[0], goal[1] - current_position[1])
+
+	if look_ahead == 0:
+		return 0.0
+
+	alpha = calc_heading_error(current_position, current_angle, goal)
+
+	return 2.0 * sin(alpha) / look_ahead
+
+
+
+def calc_angular_velocity(curvature, linear_speed, max_angular_speed):
+	"""
+	Angular velocity (rad/s) for a skid-steer robot (e.g., Jackal)
+	driving the curvature at linear_speed, clamped to max_angular_speed.
+	"""
+	angular_speed = curvature * linear_speed
+	return max(-max_angular_speed, min(max_angular_speed, angular_speed))
+
+
+
+def calc_scheduled_speed(path_curvature, max_speed, min_speed, max_lateral_accel):
+	"""
+	Linear speed (m/s) for the course's curvature ahead (1/meters, e.g.,
+	NavCourse.curvature at the target), slowing down so the lateral
+	acceleration (v^2 * curvature) stays under max_lateral_accel (m/s^2).
+	"""
+	if path_curvature == 0:
+		return max_speed
+	speed = sqrt(max_lateral_accel / abs(path_curvature))
+	return max(min_speed, min(max_speed, speed))
+
+
+
+def calc_articulation_direction(curvature, deadband):
+	"""
+	Direction to articulate an articulated-steer robot (e.g., red rover):
+	1 to turn left, -1 to turn right, 0 to hold straight if the curvature
+	is within the deadband (1/meters).
+	"""
+	if curvature > deadband:
+		return 1
+	elif curvature < -deadband:
+		return -1
+	return 0
@@ -6,12 +6,15 @@ file using the same JSON format as the row files.
 import sys
 import json
 import utm
+import course_stream  # local requirement
+import course_simplify  # local requirement
 
 
 
-def convert_latlon_csv_to_course_array(input_filename, n_skip=1):
+def convert_latlon_csv_to_course_array(input_filename, n_skip=1, tolerance=None):
 	"""
-	Converts a CSV of lat, lons to a JSON formatted course.
+	Converts a CSV of lat, lons to a JSON formatted course. tolerance
+	(meters) simplifies it, see course_simplify.
 	"""
 	print("Opening course file..")
 	filein= open(input_filename, 'r')
@@ -34,37 +37,29 @@ def convert_latlon_csv_to_course_array(input_filename, n_skip=1):
 		easting, northing = utm_val[0], utm_val[1]
 		course_array.append([easting, northing])
 
+	if tolerance:
+		course_array = course_simplify.simplify_points(course_array, tolerance)
+
 	return course_array
 
 
 
-def convert_rowfiles_to_course_array(input_filename, n_skip=1):
+def convert_rowfiles_to_course_array(input_filename, n_skip=1, tolerance=None):
 	"""
 	Converts a set of course JSON files consisting of single rows,
 	and puts them into one array that's indexed by row.
 	Ex: {'date': "", 'location': "", 'rows': [{'index': 1, 'flags': [[x1, y1],..], 'row': [[x1,y1],..]}]}
+	tolerance (meters) simplifies each row, see course_simplify.
 	"""
 	
-	# opens course file:
+	# streams the course file's utm positions:
 	print("Opening course file..")
-	filein= open(input_filename, 'r')
-	file_data = filein.read()
-	filein.close()
-
-	row_obj = json.loads(file_data)  # get row data
-	row_data = row_obj['flags']  # get array of positions
+	course_array = [[easting, northing] for easting, northing in course_stream.iter_course_points(input_filename, 'utm', n_skip)]
 
-	result_array = []
+	if tolerance:
+		course_array = course_simplify.simplify_points(course_array, tolerance)
 
-	# for pos_obj in row_data:
-	for i in range(0, len(row_data) - 1, n_skip):
-
-		easting = float(row_data[i]['utmPos']['easting'])  # gets easting utm value
-		northing = float(row_data[i]['utmPos']['northing'])  # gets northing utm value
-
-		result_array.append([easting, northing])
-
-	return result_array
+	return course_array
 
 
 
@@ -76,6 +71,7 @@ if __name__ == '__main__':
 	num_files = int(sys.argv[1])
 	output_filename = sys.argv[2]
 	n_skip = int(sys.argv[3])
+	tolerance = float(sys.argv[4]) if len(sys.argv) > 4 else None  # meters, simplifies rows instead of just skipping points
 
 	field_data = {
 		'name': "Peanut Field 2018",
@@ -95,7 +91,7 @@ if __name__ == '__main__':
 		}
 
 		# row_obj['row'] = convert_latlon_csv_to_course_array(input_filename, n_skip)  # get row data
-		row_obj['row'] = convert_rowfiles_to_course_array(input_filename, n_skip)
+		row_obj['row'] = convert_rowfiles_to_course_array(input_filename, n_skip, tolerance)
 
 		field_data['rows'].append(row_obj)
 
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+"""
+Python module for picking the look-ahead target in a course.
+
+Shared by the drive nodes (red rover and jackal), which previously
+each had their own copy of calc_target_index. The distances between the
+robot and every course point are computed in one numpy pass instead of
+building python lists on every tick. TargetTracker keeps track of where
+the robot is in the course between fixes, so each fix only searches a
+window of points ahead of it.
+
+With a course's cumulative distances (NavCourse.arc_length, best with a
+course resampled to a fixed spacing, see NavCourse.resample), the target
+can instead be the first point more than the look-ahead further along the
+course than the robot's projection onto it, found with a binary search
+(calc_arc_length_target_index) instead of walking point by point.
+"""
+
+import numpy as np
+
+
+
+def calc_distances(current_position, cx, cy):
+	"""
+	Distance (meters) between the robot's position and each x,y in
+	the course.
+	"""
+	dx = current_position[0] - np.asarray(cx, dtype=np.float64)
+	dy = current_position[1] - np.asarray(cy, dtype=np.float64)
+	return np.hypot(dx, dy)
+
+
+
+def first_index_beyond(distances, look_ahead, start_index=0):
+	"""
+	Index of the first distance (at or after start_index) that's greater
+	than the look-ahead, or None if the course ends before that.
+	"""
+	beyond = np.flatnonzero(distances[start_index:] > look_ahead)
+	if len(beyond) < 1:
+		return None
+	return start_index + int(beyond[0])
+
+
+
+def calc_target_index(current_position, cx, cy, look_ahead):
+	"""
+	From red_rover_model pure_pursuit module. Finds the course point
+	closest to the robot, then walks forward from there to the first point
+	that's further than the look-ahead distance. Returns None at the end
+	of the course.
+	"""
+	d = calc_distances(current_position, cx, cy)
+
+	if len(d) < 1:
+		return None
+
+	ind = int(np.argmin(d))  # index of closest goal to robot (first one if there's a tie)
+
+	print("Min index: {}".format(ind))
+
+	return first_index_beyond(d, look_ahead, ind)
+
+
+
+def project_onto_course(current_position, cx, cy, arc_length, ind):
+	"""
+	Distance along the course (same units as arc_length) of the robot's
+	projection onto the segment before or after point ind, whichever
+	the projection lands on.
+	"""
+	num_points = len(cx)
+	px, py = current_position[0] - cx[ind], current_position[1] - cy[ind]
+
+	if ind + 1 < num_points:
+		abx, aby = cx[ind + 1] - cx[ind], cy[ind + 1] - cy[ind]
+		seg_len2 = abx**2 + aby**2
+		u = (px * abx + py * aby) / seg_len2 if seg_len2 > 0 else 0.0
+		if u > 0:
+			return arc_length[ind] + min(u, 1.0) * (arc_length[ind + 1] - arc_length[ind])
+
+	if ind > 0:
+		abx, aby = cx[ind] - cx[ind - 1], cy[ind] - cy[ind - 1]
+		seg_len2 = abx**2 + aby**2
+		u = (px * abx + py * aby) / seg_len2 if seg_len2 > 0 else 0.0
+		if u < 0:
+			return arc_length[ind] + max(u, -1.0) * (arc_length[ind] - arc_length[ind - 1])
+
+	return arc_length[ind]
+
+
+
+def calc_arc_length_target_index(current_position, cx, cy, arc_length, look_ahead, closest_index=None):
+	"""
+	Index of the first course point that's more than look_ahead further
+	along the course than the robot's projection onto it, or None at the
+	end of the course. arc_length is the course's cumulative distance at
+	each point (e.g., NavCourse.arc_length). closest_index is the course
+	point closest to the robot if it's already known.
+	"""
+	if len(cx) < 1:
+		return None
+
+	if closest_index is None:
+		closest_index = int(np.argmin(calc_distances(current_position, cx, cy)))
+
+	along = project_onto_course(current_position, cx, cy, arc_length, closest_index)
+	ind = int(np.searchsorted(arc_length, along + look_ahead, side='right'))
+
+	if ind >= len(cx):
+		return None
+
+	return ind
+
+
+
+class TargetTracker(object):
+	"""
+	Stateful version of calc_target_index for use in the drive loops.
+
+	Rather than rescanning the whole course every tick, the closest point is
+	searched for in a window of points starting at the last matched index, so
+	the work per GPS fix doesn't grow with the length of the course. The
+	closest point only moves forward, which also keeps the robot from jumping
+	to a neighbouring row or an earlier part of a looping course. If the
+	robot ends up further than off_path_distance from the windowed match,
+	it falls back to a search over the whole course.
+
+	With use_arc_length, the target is found with calc_arc_length_target_index
+	when the course (a NavCourse) is passed to update.
+	"""
+
+	def __init__(self, look_ahead, window_size=100, off_path_distance=3.0, use_arc_length=False):
+
+		self.look_ahead = look_ahead  # look-ahead for target index, in meters
+		self.window_size = window_size  # number of course points searched per fix
+		self.off_path_distance = off_path_distance  # distance (meters) from course that triggers a global search
+		self.use_arc_length = use_arc_length  # look ahead along the course's arc length instead of by distance to robot
+
+		self.closest_index = None  # index of course point last matched to the robot
+		self.global_searches = 0  # number of times the tracker had to fall back to a global search
+
+
+
+	def reset(self, index=None):
+		"""
+		Resets the tracker, e.g., when a new course (or what's left of
+		one) is loaded. Leaving index as None makes the next update search
+		the whole course.
+		"""
+		self.closest_index = index
+
+
+
+	def update(self, current_position, cx, cy, course_index=None, index_offset=0):
+		"""
+		Returns the look-ahead target index for the robot's current position,
+		or None if the end of the course is reached.
+
+		If a CourseIndex (see course_index module) of the course is given,
+		it's used for the whole-course search. index_offset is the index in
+		that CourseIndex of the first point in cx, cy (e.g., after the course
+		is trimmed at a flag). A NavCourse can be given in place of the
+		CourseIndex, in which case index_offset is left at 0.
+		"""
+		num_points = len(cx)
+
+		if num_points < 1:
+			return None
+
+		ind = None
+		if self.closest_index is not None and self.closest_index < num_points:
+			ind, dist = self.find_closest_in_window(current_position, cx, cy, self.closest_index)
+			if dist > self.off_path_distance:
+				print("Robot is {}m from the course, searching the whole course..".format(dist))
+				ind = None
+
+		if ind is None:
+			ind = self.find_closest(current_position, cx, cy, course_index, index_offset)
+			self.global_searches += 1
+
+		self.closest_index = ind
+
+		arc_length = getattr(course_index, 'arc_length', None) if self.use_arc_length else None
+		if arc_length is not None:
+			return calc_arc_length_target_index(current_position, cx, cy, arc_length, self.look_ahead, ind)
+
+		return self.find_look_ahead_index(current_position, cx, cy, ind)
+
+
+
+	def find_closest(self, current_position, cx, cy, course_index=None, index_offset=0):
+		"""
+		Finds the closest point in the whole course, using the course's
+		spatial index if there is one.
+		"""
+		if course_index is not None:
+			ind, dist = course_index.nearest(current_position, index_offset)
+			if ind is not None:
+				return ind - index_offset
+
+		return int(np.argmin(calc_distances(current_position, cx, cy)))
+
+
+
+	def find_closest_in_window(self, current_position, cx, cy, start_index):
+		"""
+		Finds the closest course point in the window starting at start_index.
+		The window slides forward while the closest point is the last one in
+		the window (i.e., the robot has moved past it since the last fix).
+		Returns the index and its distance to the robot.
+		"""
+		num_points = len(cx)
+
+		while True:
+			end_index = min(start_index + self.window_size, num_points)
+			d = calc_distances(current_position, cx[start_index:end_index], cy[start_index:end_index])
+			local_ind = int(np.argmin(d))
+
+			if local_ind < len(d) - 1 or end_index >= num_points or local_ind == 0:
+				return start_index + local_ind, float(d[local_ind])
+
+			start_index += local_ind
+
+
+
+	def find_look_ahead_index(self, current_position, cx, cy, start_index):
+		"""
+		Walks forward from start_index, a window at a time, to the first
+		point that's further than the look-ahead.
+		"""
+		num_points = len(cx)
+
+		while start_index < num_points:
+			end_index = min(start_index + self.window_size, num_points)
+			d = calc_distances(current_position, cx[start_index:end_index], cy[start_index:end_index])
+			ind = first_index_beyond(d, self.look_ahead)
+			if ind is not None:
+				return start_index + ind
+			start_index = end_index
+
+		return None